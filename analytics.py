@@ -0,0 +1,240 @@
+# FIRECRACKER - ANALYTICS
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+from schema import MONTH_ORDER, DAY_OF_WEEK_ORDER, concat_records
+
+
+
+# Step 2: Define dimensions and measures of the incident cube ---------------------------------------------------------------------------------------------------------
+CUBE_KEYS = [
+    "CalYear",
+    "Quarter_Year",
+    "IncidentGroup",
+    "IncGeo_BoroughName",
+    "StopCodeDescription",
+    "Grouped_SpecialServiceType"
+]
+CUBE_METRICS = [
+    "FirstPumpArriving_AttendanceTime",
+    "TravelTimeSeconds",
+    "TurnoutTimeSeconds",
+    "PumpMinutesRounded"
+]
+CUBE_MEASURES = ["Count", "Delayed"] + [f"{metric}_{suffix}" for metric in CUBE_METRICS for suffix in ["sum", "n"]]
+
+
+
+# Step 3: Define functions to build and query incident cube -----------------------------------------------------------------------------------------------------------
+# 3a: Define function to pre-aggregate records into counts, delay counts and metric sums/counts per cube cell
+def build_cube(records):
+    measures = {
+        "Count": np.ones(len(records), dtype="int32"),
+        "Delayed": (records["Grouped_DelayType"] == "Delayed").to_numpy(dtype="int32")
+    }
+    for metric in CUBE_METRICS:
+        values = records[metric].to_numpy(dtype="float64")
+        measures[f"{metric}_sum"] = np.nan_to_num(values)
+        measures[f"{metric}_n"] = (~np.isnan(values)).astype("int32")
+
+    cube_input = pd.concat([records[CUBE_KEYS], pd.DataFrame(measures, index=records.index)], axis=1)
+    cube = cube_input.groupby(CUBE_KEYS, observed=True, dropna=False).sum().reset_index()
+    return cube
+
+
+# 3b: Define function to select cube cells matching the user selection (cube is sorted by year, so years are sliced by binary search)
+def slice_cube(cube, start_year, end_year, incident_group, borough_name):
+    first_row, end_row = np.searchsorted(cube["CalYear"].to_numpy(), [start_year, end_year + 1], side="left")
+    cube_slice = cube.iloc[first_row:end_row]
+    if incident_group != "All Incidents":
+        cube_slice = cube_slice[cube_slice["IncidentGroup"] == incident_group]
+    if borough_name != "All Boroughs":
+        cube_slice = cube_slice[cube_slice["IncGeo_BoroughName"] == borough_name]
+    return cube_slice
+
+
+# 3c: Define function to roll up cube cells to the requested dimensions
+def roll_up(cube_slice, by):
+    return cube_slice.groupby(by, observed=True)[CUBE_MEASURES].sum()
+
+
+# 3d: Define function to calculate average of metric from rolled-up sums and counts
+def average(rolled_up, metric):
+    return rolled_up[f"{metric}_sum"] / rolled_up[f"{metric}_n"]
+
+
+
+# Step 4: Define functions to aggregate records by time period --------------------------------------------------------------------------------------------------------
+HOURS = list(range(24))
+TIME_PERIODS = {
+    "Month": MONTH_ORDER,
+    "Day of Week": DAY_OF_WEEK_ORDER,
+    "Hour of Day": HOURS
+}
+
+
+# 4a: Define function to count records per month, weekday, hour and category of a column in a single pass
+def time_histogram(records, column):
+    month_codes = records["Month"].cat.codes.to_numpy().astype(np.int64)
+    weekday_codes = records["DayOfWeek"].cat.codes.to_numpy().astype(np.int64)
+    hours = records["HourOfCall"].to_numpy().astype(np.int64)
+    column_codes = records[column].cat.codes.to_numpy().astype(np.int64)
+    categories = records[column].cat.categories
+
+    # Combine codes into one integer per record and count all combinations at once (records with missing values are skipped like in groupby)
+    valid = (month_codes >= 0) & (weekday_codes >= 0) & (hours >= 0) & (hours < len(HOURS)) & (column_codes >= 0)
+    shape = (len(MONTH_ORDER), len(DAY_OF_WEEK_ORDER), len(HOURS), len(categories))
+    combined_codes = np.ravel_multi_index((month_codes[valid], weekday_codes[valid], hours[valid], column_codes[valid]), shape)
+    counts = np.bincount(combined_codes, minlength=int(np.prod(shape))).reshape(shape)
+    return counts, categories
+
+
+# 4b: Define function to sum histogram over the other time periods (only periods and categories with records are kept)
+def time_distribution(histogram, time_period):
+    counts, categories = histogram
+    other_axes = {"Month": (1, 2), "Day of Week": (0, 2), "Hour of Day": (0, 1)}[time_period]
+    distribution = pd.DataFrame(counts.sum(axis=other_axes), index=TIME_PERIODS[time_period], columns=categories)
+    return distribution.loc[distribution.any(axis=1), distribution.any(axis=0)]
+
+
+
+# Step 5: Define functions to count records per category --------------------------------------------------------------------------------------------------------------
+# 5a: Define function to count records per category of a column in a single pass
+def category_counts(records, column):
+    codes = records[column].cat.codes.to_numpy()
+    categories = records[column].cat.categories
+    return pd.Series(np.bincount(codes[codes >= 0], minlength=len(categories)), index=categories)
+
+
+# 5b: Define function to sort categories with records by count in descending order
+def breakdown(counts, column):
+    counts = counts[counts > 0]
+    order = np.argsort(-counts.to_numpy(), kind="stable")
+    return pd.DataFrame({column: counts.index[order], "Count": counts.to_numpy()[order]})
+
+
+# 5c: Define function to keep largest categories and sum up remaining ones as "Other" (ties in category order, only the largest categories are sorted)
+def top_breakdown(counts, column, k=5):
+    values = counts.to_numpy()
+    threshold = np.partition(values, len(values) - k)[len(values) - k] if len(values) > k else 0
+    top = np.flatnonzero((values >= threshold) & (values > 0))
+    top = top[np.lexsort((top, -values[top]))][:k]
+    other_count = values.sum() - values[top].sum()
+    return pd.DataFrame({column: list(counts.index[top]) + ["Other"], "Count": np.append(values[top], other_count)})
+
+
+
+# Step 6: Define functions to merge partial aggregates of chunks of records -------------------------------------------------------------------------------------------
+# 6a: Define function to merge incident cubes of chunks of records into one cube (cells of the same dimensions are added up)
+def merge_cubes(cubes):
+    merged_cube = concat_records(cubes).groupby(CUBE_KEYS, observed=True, dropna=False).sum().reset_index()
+    return merged_cube
+
+
+# 6b: Define function to add up other partial aggregates (counts and sums add up, categories are shared by all chunks)
+def add_partials(left, right):
+    if isinstance(left, tuple):
+        return (add_partials(left[0], right[0]),) + left[1:]
+    return left + right
+
+
+
+# Step 7: Define functions to calculate quarterly average times from integer quarter codes ----------------------------------------------------------------------------
+QUARTER_METRICS = ["FirstPumpArriving_AttendanceTime", "TravelTimeSeconds", "TurnoutTimeSeconds"]
+INCIDENT_GROUP_ORDER = ["False Alarm", "Special Service", "Fire"]
+
+
+# 7a: Define functions to encode quarters ("Q1_2015") as consecutive integers (year * 4 + quarter - 1) and decode them into axis labels ("Q1 2015")
+def quarter_codes(quarters):
+    return np.array([int(quarter[3:]) * 4 + int(quarter[1]) - 1 for quarter in quarters], dtype=np.int64)
+
+
+def quarter_labels(codes):
+    return [f"Q{code % 4 + 1} {code // 4}" for code in codes]
+
+
+# 7b: Define function to sum measures per quarter and incident group in a single pass over cube cells (array of quarters x groups x measures)
+def quarterly_sums(cube_slice, start_year, end_year, measures):
+    groups = cube_slice["IncidentGroup"].cat.categories
+    quarter_category_codes = quarter_codes(cube_slice["Quarter_Year"].cat.categories)
+    codes = cube_slice["Quarter_Year"].cat.codes.to_numpy()
+    group_codes = cube_slice["IncidentGroup"].cat.codes.to_numpy()
+    quarters = np.full(len(codes), -1, dtype=np.int64)
+    quarters[codes >= 0] = quarter_category_codes[codes[codes >= 0]] - start_year * 4
+    n_quarters = (end_year - start_year + 1) * 4
+
+    # Combine quarter and group into one integer per cell and add up all measures with the same combined code
+    valid = (codes >= 0) & (group_codes >= 0) & (quarters >= 0) & (quarters < n_quarters)
+    combined_codes = quarters[valid] * len(groups) + group_codes[valid]
+    sums = [np.bincount(combined_codes, weights=cube_slice[measure].to_numpy(dtype="float64")[valid], minlength=n_quarters * len(groups)) for measure in measures]
+    return np.stack(sums, axis=-1).reshape(n_quarters, len(groups), len(measures)), groups
+
+
+# 7c: Define function to calculate average times by component (for selected incident group) and average attendance times by incident group per quarter
+def quarterly_averages(cube_slice, start_year, end_year, incident_group):
+    measures = ["Count"] + [f"{metric}_{suffix}" for metric in QUARTER_METRICS for suffix in ["sum", "n"]]
+    sums, groups = quarterly_sums(cube_slice, start_year, end_year, measures)
+    if incident_group == "All Incidents":
+        selected_sums = sums.sum(axis=1)
+    elif incident_group in groups:
+        selected_sums = sums[:, groups.get_loc(incident_group)]
+    else:
+        selected_sums = np.zeros((sums.shape[0], len(measures)))
+
+    # Keep quarters with records of the selected incident group
+    displayed = selected_sums[:, 0] > 0
+    labels = quarter_labels(np.arange(start_year * 4, (end_year + 1) * 4)[displayed])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        component_averages = selected_sums[displayed, 1::2] / selected_sums[displayed, 2::2]
+        group_averages = sums[displayed, :, 1] / sums[displayed, :, 2]
+    average_times = pd.DataFrame(component_averages, index=labels, columns=QUARTER_METRICS).round(2)
+    average_times_incident_group = pd.DataFrame(group_averages, index=labels, columns=groups).round(2).reindex(columns=INCIDENT_GROUP_ORDER)
+    return average_times, average_times_incident_group
+
+
+
+# Step 8: Define dense matrix of boroughs x years x incident groups x measures answering map values and stats ---------------------------------------------------------
+BOROUGH_MEASURES = ["Count", "Delayed", "FirstPumpArriving_AttendanceTime_sum", "FirstPumpArriving_AttendanceTime_n", "PumpMinutesRounded_sum", "PumpMinutesRounded_n"]
+
+
+class BoroughMatrix:
+    def __init__(self, cube):
+        # Use last borough and last incident group for cube cells without borough or incident group (counted in totals, not shown on map)
+        self.boroughs = cube["IncGeo_BoroughName"].cat.categories
+        self.groups = cube["IncidentGroup"].cat.categories
+        self.first_year = int(cube["CalYear"].min()) if len(cube) else 0
+        borough_codes = np.where(cube["IncGeo_BoroughName"].cat.codes < 0, len(self.boroughs), cube["IncGeo_BoroughName"].cat.codes)
+        group_codes = np.where(cube["IncidentGroup"].cat.codes < 0, len(self.groups), cube["IncidentGroup"].cat.codes)
+        year_codes = cube["CalYear"].to_numpy(dtype=np.int64) - self.first_year
+
+        # Add up measures of all cube cells with the same borough, year and incident group
+        shape = (len(self.boroughs) + 1, int(year_codes.max()) + 1 if len(cube) else 0, len(self.groups) + 1)
+        combined_codes = np.ravel_multi_index((borough_codes, year_codes, group_codes), shape)
+        sums = [np.bincount(combined_codes, weights=cube[measure].to_numpy(dtype="float64"), minlength=int(np.prod(shape))) for measure in BOROUGH_MEASURES]
+        self.values = np.stack(sums, axis=-1).reshape(shape + (len(BOROUGH_MEASURES),))
+
+    # 8a: Define function to sum up measures of selected years and incident group (array of borough slots x measures)
+    def select(self, start_year, end_year, incident_group):
+        values = self.values[:, max(start_year - self.first_year, 0):max(end_year - self.first_year + 1, 0)].sum(axis=1)
+        if incident_group == "All Incidents":
+            return values.sum(axis=1)
+        if incident_group in self.groups:
+            return values[:, self.groups.get_loc(incident_group)]
+        return np.zeros((values.shape[0], len(BOROUGH_MEASURES)))
+
+    # 8b: Define function to return measures per borough with records (counts as integers)
+    def by_borough(self, start_year, end_year, incident_group):
+        values = self.select(start_year, end_year, incident_group)[:-1]
+        displayed = values[:, 0] > 0
+        by_borough = pd.DataFrame(values[displayed], index=pd.Index(self.boroughs[displayed], name="IncGeo_BoroughName"), columns=BOROUGH_MEASURES)
+        return by_borough.astype({measure: "int64" for measure in BOROUGH_MEASURES if not measure.endswith("_sum")})
+
+    # 8c: Define function to return measures of selected borough or of all records
+    def totals(self, start_year, end_year, incident_group, borough_name):
+        values = self.select(start_year, end_year, incident_group)
+        if borough_name == "All Boroughs":
+            return pd.Series(values.sum(axis=0), index=BOROUGH_MEASURES)
+        if borough_name in self.boroughs:
+            return pd.Series(values[self.boroughs.get_loc(borough_name)], index=BOROUGH_MEASURES)
+        return pd.Series(0.0, index=BOROUGH_MEASURES)
@@ -0,0 +1,169 @@
+# FIRECRACKER - JSON API
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import hashlib
+import json
+import math
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+from caching import LRUCache
+from filter_engine import BACKENDS, live_engine
+from queries import INCIDENT_GROUPS, CHART_TYPES, MAP_METRICS, TIME_PERIOD_OPTIONS, COMPARISON_METRICS, PROPERTY_COLUMNS
+from queries import incident_facts, development_table, borough_values, borough_statistic, time_period_table, response_times, property_breakdown
+
+
+
+# Step 2: Define endpoints returning the numbers of each dashboard chart (query, name of chart option and its options) ------------------------------------------------
+# 2a: Define queries of endpoints without matching query function
+def facts(filter_engine, start_year, end_year, incident_group, borough_name, option):
+    return incident_facts(filter_engine.cube, filter_engine.filtered_cube(start_year, end_year, incident_group, borough_name))
+
+
+def boroughs(filter_engine, start_year, end_year, incident_group, borough_name, map_metric):
+    return {
+        "values": to_json_value(borough_values(filter_engine, start_year, end_year, incident_group, map_metric)),
+        "statistic": borough_statistic(filter_engine, start_year, end_year, incident_group, borough_name, map_metric)
+    }
+
+
+ENDPOINTS = {
+    "/api/facts": (facts, None, None),
+    "/api/development": (development_table, "chart_type", CHART_TYPES),
+    "/api/boroughs": (boroughs, "map_metric", MAP_METRICS),
+    "/api/time-periods": (time_period_table, "time_period", TIME_PERIOD_OPTIONS),
+    "/api/response-times": (response_times, "comparison_metric", COMPARISON_METRICS),
+    "/api/properties": (property_breakdown, "property_metric", list(PROPERTY_COLUMNS))
+}
+
+
+# 2b: Define function to convert query result into JSON value (data frames and series with index, columns and data, missing values as null)
+def to_json_value(result):
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return json.loads(result.to_json(orient="split"))
+    return result
+
+
+# 2c: Define function to return filters, options and data version of the current filter engine
+def describe(filter_engine):
+    return {
+        "version": filter_engine.version,
+        "years": [int(filter_engine.cube["CalYear"].min()), int(filter_engine.cube["CalYear"].max())],
+        "incident_groups": INCIDENT_GROUPS,
+        "boroughs": ["All Boroughs"] + sorted(filter_engine.cube["IncGeo_BoroughName"].dropna().unique()),
+        "endpoints": {path: {option_name: options} if option_name else {} for path, (query, option_name, options) in ENDPOINTS.items()}
+    }
+
+
+
+# Step 3: Define function to answer a request from response cache (one body and ETag per data version, endpoint and selection) ----------------------------------------
+RESPONSE_CACHE = LRUCache(maxsize=256)
+
+
+# Invalid user selections (unknown options, years outside the records or in wrong order) are answered with 400 Bad Request
+class BadRequest(ValueError):
+    pass
+
+
+def respond(backend, path, parameters):
+    filter_engine = live_engine(backend).current()
+    if path == "/api":
+        return RESPONSE_CACHE.get_or_compute((filter_engine.version, path), lambda: encode(describe(filter_engine)))
+    if path not in ENDPOINTS:
+        return None
+    query, option_name, options = ENDPOINTS[path]
+
+    # Read user selection (same defaults as the dashboard)
+    def parameter(name, default):
+        return parameters.get(name, [default])[0]
+    try:
+        start_year = int(parameter("start_year", filter_engine.cube["CalYear"].min()))
+        end_year = int(parameter("end_year", filter_engine.cube["CalYear"].max()))
+    except ValueError:
+        raise BadRequest("start_year and end_year must be integers")
+    first_year, last_year = int(filter_engine.cube["CalYear"].min()), int(filter_engine.cube["CalYear"].max())
+    if not first_year <= start_year <= end_year <= last_year:
+        raise BadRequest(f"start_year and end_year must satisfy {first_year} <= start_year <= end_year <= {last_year}")
+    incident_group = parameter("incident_group", "All Incidents")
+    borough_name = parameter("borough", "All Boroughs")
+    option = parameter(option_name, options[0]) if option_name else None
+    if incident_group not in INCIDENT_GROUPS:
+        raise BadRequest(f"incident_group must be one of {INCIDENT_GROUPS}")
+    if borough_name != "All Boroughs" and borough_name not in filter_engine.cube["IncGeo_BoroughName"].cat.categories:
+        raise BadRequest(f"Unknown borough {borough_name!r}")
+    if option_name and option not in options:
+        raise BadRequest(f"{option_name} must be one of {options}")
+
+    key = (filter_engine.version, path, start_year, end_year, incident_group, borough_name, option)
+    return RESPONSE_CACHE.get_or_compute(key, lambda: encode(to_json_value(query(filter_engine, start_year, end_year, incident_group, borough_name, option))))
+
+
+# 3a: Define function to encode JSON body and its ETag (NaN is not valid JSON, so missing values of selections without responses are encoded as null)
+def encode(value):
+    body = json.dumps(without_nan(value), allow_nan=False).encode()
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+# 3b: Define function to replace NaN and infinite numbers in nested dicts and lists with None
+def without_nan(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: without_nan(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [without_nan(item) for item in value]
+    return value
+
+
+
+# Step 4: Define HTTP handler (GET only, conditional requests with If-None-Match answered with 304 Not Modified) ------------------------------------------------------
+class APIHandler(BaseHTTPRequestHandler):
+    backend = "memory"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            response = respond(self.backend, url.path.rstrip("/"), parse_qs(url.query))
+        except BadRequest as error:
+            return self.send_body(400, *encode({"error": str(error)}))
+        except Exception as error:
+            # Any other failure of a query is answered with 500 Internal Server Error instead of closing the connection
+            self.log_error("Query failed for %s: %r", self.path, error)
+            return self.send_body(500, *encode({"error": f"Internal error: {type(error).__name__}"}))
+        if response is None:
+            return self.send_body(404, *encode({"error": f"Unknown endpoint {url.path}, see /api"}))
+        body, etag = response
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_body(200, body, etag)
+
+    # 4a: Define function to send JSON body (clients revalidate with ETag, as the data version may change)
+    def send_body(self, status, body, etag):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+
+# Step 5: Start API server from repository root ("python api.py", then e.g. GET /api/boroughs?start_year=2020&map_metric=Percentage+of+Delays) ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve numbers of the dashboard charts as JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--backend", default=os.environ.get("LFB_BACKEND", "memory"), choices=BACKENDS)
+    args = parser.parse_args()
+
+    APIHandler.backend = args.backend
+    live_engine(args.backend)
+    server = ThreadingHTTPServer((args.host, args.port), APIHandler)
+    print(f"Serving dashboard numbers on http://{args.host}:{args.port}/api")
+    server.serve_forever()
@@ -0,0 +1,107 @@
+# FIRECRACKER - PARITY CHECK OF FILTER ENGINE BACKENDS
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics import CUBE_KEYS, CUBE_MEASURES
+from data_loader import read_manifest
+from filter_engine import create_engine, BACKENDS
+
+
+
+# Step 2: Define user selections and queries compared between backends ------------------------------------------------------------------------------------------------
+SELECTIONS = [
+    (2009, 2023, "All Incidents", "All Boroughs"),
+    (2012, 2015, "All Incidents", "All Boroughs"),
+    (2009, 2023, "Fire", "All Boroughs"),
+    (2009, 2023, "All Incidents", "WESTMINSTER"),
+    (2012, 2015, "Special Service", "CAMDEN"),
+    (2020, 2020, "False Alarm", "HACKNEY")
+]
+GROUP_COLUMNS = {
+    "All Incidents": "IncidentGroup",
+    "Fire": "StopCodeDescription",
+    "False Alarm": "StopCodeDescription",
+    "Special Service": "Grouped_SpecialServiceType"
+}
+
+
+# 2a: Define function to run all queries of the dashboard for a user selection
+def run_queries(engine, selection):
+    column = GROUP_COLUMNS[selection[2]]
+    return {
+        "cube": engine.filtered_cube(*selection),
+        "cube without borough": engine.cube_without_borough(*selection[:3]),
+        "cube without incident group": engine.cube_without_incident_group(*selection[:2], selection[3]),
+        "time histogram": engine.time_histogram(*selection, column),
+        "property categories": engine.category_counts(*selection, "Grouped_PropertyCategory"),
+        "property types": engine.category_counts(*selection, "PropertyType")
+    }
+
+
+
+# Step 3: Define function to compare results of two backends (counts must be equal, sums of times may differ by rounding) ---------------------------------------------
+def compare(name, expected, actual, tolerance):
+    if name.startswith("cube"):
+        expected, actual = expected.reset_index(drop=True), actual.reset_index(drop=True)
+        if len(expected) != len(actual) or not expected[CUBE_KEYS].astype(str).equals(actual[CUBE_KEYS].astype(str)):
+            return "different cube cells"
+        for measure in CUBE_MEASURES:
+            if not np.allclose(expected[measure].to_numpy(dtype="float64"), actual[measure].to_numpy(dtype="float64"), rtol=tolerance, atol=0):
+                return f"different {measure}"
+        return None
+    if name == "time histogram":
+        if list(expected[1]) != list(actual[1]) or not np.array_equal(expected[0], actual[0]):
+            return "different counts"
+        return None
+    if not expected.equals(actual):
+        return "different counts"
+    return None
+
+
+
+# Step 4: Define function to check all backends against in-memory backend and report query times ----------------------------------------------------------------------
+def run(backends, tolerance):
+    manifest = read_manifest()
+    results = {}
+    failures = 0
+    print(f"{'backend':<12}{'load s':>8}{'queries ms':>12}{'mismatches':>12}")
+    for backend in ["memory"] + [backend for backend in backends if backend != "memory"]:
+        start = time.perf_counter()
+        try:
+            engine = create_engine(backend, manifest)
+        except ImportError as error:
+            print(f"{backend:<12}skipped ({error})")
+            continue
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results[backend] = [run_queries(engine, selection) for selection in SELECTIONS]
+        query_time = time.perf_counter() - start
+
+        mismatches = []
+        for selection, expected, actual in zip(SELECTIONS, results["memory"], results[backend]):
+            for name in expected:
+                difference = compare(name, expected[name], actual[name], tolerance)
+                if difference:
+                    mismatches.append(f"  {selection} {name}: {difference}")
+        failures += len(mismatches)
+        print(f"{backend:<12}{load_time:>8.2f}{query_time * 1000:>12.1f}{len(mismatches):>12}")
+        for mismatch in mismatches:
+            print(mismatch)
+    return failures
+
+
+
+# Step 5: Run check from repository root ("python benchmarks/backend_parity.py", exits with status 1 on mismatches) ---------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that all filter engine backends return the same numbers as the in-memory backend")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="relative tolerance for sums of times")
+    args = parser.parse_args()
+    sys.exit(1 if run(args.backends, args.tolerance) else 0)
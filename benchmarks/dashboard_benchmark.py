@@ -0,0 +1,184 @@
+# FIRECRACKER - BENCHMARK SUITE OF DASHBOARD STAGES ON SYNTHETIC RECORDS
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from synthetic_data import BASE_ROWS_PER_YEAR, SOURCE_YEARS, generate
+from backend_parity import SELECTIONS
+from filter_engine import BACKENDS
+
+
+
+# Step 2: Define worker timing all dashboard stages headlessly (runs in directory of one data size, so every size starts with a fresh process) ------------------------
+# 2a: Define function to return peak resident memory of this process in MB
+def peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# 2b: Define function to run stages of the dashboard and summarize measurements of instrumentation
+# Display functions are called outside a session (no browser), caches are cleared before each selection so every aggregation is computed
+def run_worker(backend, repeats):
+    logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").setLevel(logging.ERROR)
+    import app_vF
+    from data_loader import STORE_DIR, read_source_files, ingest_source_files, read_manifest
+    from filter_engine import create_engine
+    from figures import FIGURE_CACHE
+    from borough_map import TOPOJSON_FILE
+    from instrumentation import begin_run, end_run, stage, measurements
+
+    # Load records as before the record store (memory backend only), ingest CSV extracts into record store and load filter engine (column store lets parallel workers map records)
+    if backend == "memory":
+        with stage("read_source_files") as measurement:
+            measurement["rows"] = len(read_source_files())
+    shutil.rmtree(STORE_DIR, ignore_errors=True)
+    with stage("ingest_source_files") as measurement:
+        ingest_source_files(column_store=backend in ("memory", "parallel"))
+        measurement["rows"] = sum(partition["rows"] for partition in read_manifest()["partitions"].values())
+    with stage("engine load") as measurement:
+        filter_engine = create_engine(backend, read_manifest())
+        measurement["rows"] = int(filter_engine.cube["Count"].sum())
+    if backend == "parallel" and not isinstance(filter_engine.executor, ProcessPoolExecutor):
+        raise RuntimeError(f"Parallel engine fell back to {filter_engine.kind} pool, worker processes were not measured")
+    load_memory = peak_memory_mb()
+
+    # Run filter block of main() and all display functions for each selection
+    map_geometry = "topojson" if os.path.exists(TOPOJSON_FILE) else "geojson"
+    for repeat in range(repeats):
+        for start_year, end_year, incident_group, borough_name in SELECTIONS:
+            filter_engine.cache.clear()
+            FIGURE_CACHE.clear()
+            selection = (filter_engine, start_year, end_year, incident_group, borough_name)
+            begin_run("benchmark")
+            with stage("filtering") as measurement:
+                filtered_cube = filter_engine.filtered_cube(start_year, end_year, incident_group, borough_name)
+                measurement["rows"] = int(filtered_cube["Count"].sum())
+            app_vF.display_incident_facts(filter_engine.cube, filtered_cube)
+            app_vF.display_development_incident_group(*selection)
+            app_vF.display_map(*selection, map_geometry)
+            app_vF.display_incidents_by_time(*selection)
+            app_vF.display_average_times(*selection)
+            app_vF.display_split_by_property(*selection)
+            end_run()
+
+    # Summarize stages (display stages cover the records of the selection measured by the filter stage of the same run)
+    data = measurements()
+    data["rows"] = data["rows"].fillna(data.groupby("run")["rows"].transform("max"))
+    stages = {}
+    for name, group in data.groupby("stage", sort=False):
+        seconds = group["seconds"].median()
+        stages[name] = {
+            "calls": len(group),
+            "median_ms": seconds * 1000,
+            "total_ms": group["seconds"].sum() * 1000,
+            "rows_per_second": group["rows"].sum() / group["seconds"].sum() if group["rows"].notna().all() else None,
+            "memory_mb": group["memory_bytes"].median() / 2**20 if group["memory_bytes"].notna().any() else None
+        }
+    return {"stages": stages, "load_peak_memory_mb": load_memory, "peak_memory_mb": peak_memory_mb()}
+
+
+
+# Step 3: Define functions to write and compare reports ---------------------------------------------------------------------------------------------------------------
+# 3a: Define function to print stages of a report (compared with older report if given)
+def print_report(report, baseline=None):
+    print(f"{'size':<8}{'stage':<56}{'median ms':>11}{'rows/s':>14}{'baseline ms':>13}{'change':>9}")
+    for size, result in report["sizes"].items():
+        for name, values in result["stages"].items():
+            rows_per_second = f"{values['rows_per_second']:,.0f}" if values["rows_per_second"] else ""
+            old_values = (baseline or {}).get("sizes", {}).get(size, {}).get("stages", {}).get(name)
+            comparison = f"{old_values['median_ms']:>13.1f}{(values['median_ms'] / old_values['median_ms'] - 1) * 100:>8.0f}%" if old_values else ""
+            print(f"{size:<8}{name:<56}{values['median_ms']:>11.1f}{rows_per_second:>14}{comparison}")
+        print(f"{size:<8}{'peak memory MB (after load / end)':<56}{result['load_peak_memory_mb']:>11.0f}{result['peak_memory_mb']:>14.0f}")
+
+
+# 3b: Define function to return revision of repository (empty if git is not available)
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+
+# Step 4: Define function to generate synthetic records of each size (reused if present) and run worker on each -------------------------------------------------------
+def run(scales, rows_per_year, backend, repeats, data_dir, report_path, trace_memory):
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "backend": backend,
+        "repeats": repeats,
+        "sizes": {}
+    }
+    for scale in scales:
+        size = f"{scale:g}x"
+        directory = os.path.join(data_dir, size)
+        rows = int(rows_per_year * scale)
+
+        # Generate synthetic extracts unless extracts of the same size exist
+        settings_path = os.path.join(directory, "synthetic.json")
+        settings = {"rows_per_year": rows}
+        existing_settings = None
+        if os.path.exists(settings_path):
+            with open(settings_path) as file:
+                existing_settings = json.load(file)
+        if existing_settings != settings:
+            start = time.perf_counter()
+            total_rows = generate(directory, rows)
+            with open(settings_path, "w") as file:
+                json.dump(settings, file)
+            print(f"Generated {total_rows:,} records for {size} in {time.perf_counter() - start:.1f} s")
+
+        # Run worker in fresh process within directory of synthetic extracts
+        result_path = os.path.join(directory, "result.json")
+        # Disk caches are disabled so every run computes all aggregations and maps
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_DIR, os.environ.get("PYTHONPATH", "")]), LFB_TRACE_MEMORY="1" if trace_memory else "0", LFB_AGGREGATE_CACHE_MB="0", LFB_MAP_CACHE_MB="0")
+        env.pop("LFB_METRICS_FILE", None)
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", result_path, "--backend", backend, "--repeats", str(repeats)], cwd=directory, env=env, check=True)
+        with open(result_path) as file:
+            report["sizes"][size] = dict(json.load(file), rows=rows * sum(last_year - first_year + 1 for first_year, last_year in SOURCE_YEARS))
+
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w") as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+
+# Step 5: Run benchmark from repository root ("python benchmarks/dashboard_benchmark.py --scales 1 10 100 --compare OLD_REPORT") --------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time loading, filtering and display functions on synthetic records of several sizes and write comparable report")
+    parser.add_argument("--scales", nargs="+", type=float, default=[1, 10, 100], help="multiples of the real record count")
+    parser.add_argument("--rows-per-year", type=int, default=BASE_ROWS_PER_YEAR, help="records per year at scale 1")
+    parser.add_argument("--backend", default="memory", choices=BACKENDS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.path.join(REPO_DIR, "benchmarks", "data"))
+    parser.add_argument("--report", default=os.path.join(REPO_DIR, "benchmarks", "reports", f"report-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    parser.add_argument("--compare", help="older report to compare with")
+    parser.add_argument("--trace-memory", action="store_true", help="record memory allocated per stage (slower)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, "w") as file:
+            json.dump(run_worker(args.backend, args.repeats), file)
+    else:
+        report = run(args.scales, args.rows_per_year, args.backend, args.repeats, args.data_dir, args.report, args.trace_memory)
+        baseline = None
+        if args.compare:
+            with open(args.compare) as file:
+                baseline = json.load(file)
+        print_report(report, baseline)
+        print(f"Wrote report to {args.report}")
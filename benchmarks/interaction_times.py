@@ -0,0 +1,128 @@
+# FIRECRACKER - BENCHMARK OF CHART INTERACTIONS (FULL RERUN VS FRAGMENT RERUN)
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from tornado.ioloop import IOLoop
+from tornado.websocket import websocket_connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app_vF.py")
+
+
+
+# Step 2: Define chart dropdowns and options changed by the benchmark -------------------------------------------------------------------------------------------------
+INTERACTIONS = [
+    ("Select chart type:", "Percentage"),
+    ("Select metric:", "Percentage of Delays"),
+    ("Select time period:", "Hour of Day"),
+    ("Select comparison metric:", "Average Attendance Time by Incident Group"),
+    ("Select property metric:", "Property Type")
+]
+
+
+
+# Step 3: Define browser session talking to the web application over its websocket ------------------------------------------------------------------------------------
+class Session:
+    def __init__(self, connection):
+        self.connection = connection
+        self.selectboxes = {}
+        self.widget_states = {}
+
+    # 3a: Define function to request a rerun (whole script or one fragment) and return seconds and bytes until the run finished
+    async def rerun(self, fragment_id=""):
+        message = BackMsg()
+        message.rerun_script.widget_states.widgets.extend(self.widget_states.values())
+        message.rerun_script.fragment_id = fragment_id
+        start = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+        received = 0
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise ConnectionError("Web application closed the connection")
+            received += len(data)
+            forward_message = ForwardMsg()
+            forward_message.ParseFromString(data)
+            if forward_message.WhichOneof("type") == "delta" and forward_message.delta.new_element.WhichOneof("type") == "selectbox":
+                selectbox = forward_message.delta.new_element.selectbox
+                self.selectboxes[selectbox.label] = (selectbox.id, list(selectbox.options), forward_message.delta.fragment_id)
+            if forward_message.WhichOneof("type") == "script_finished":
+                return time.perf_counter() - start, received
+
+    # 3b: Define function to change a dropdown and rerun whole script (as without fragments) or only the fragment of the dropdown
+    async def select(self, label, option, fragment):
+        widget_id, options, fragment_id = self.selectboxes[label]
+        state = WidgetState(id=widget_id, int_value=options.index(option))
+        self.widget_states[widget_id] = state
+        return await self.rerun(fragment_id if fragment else "")
+
+
+
+# Step 4: Define function to run interactions in both modes and report median times -----------------------------------------------------------------------------------
+async def measure(url, repeats):
+    connection = await websocket_connect(url.replace("http", "ws", 1) + "/_stcore/stream", max_message_size=1 << 30)
+    session = Session(connection)
+    first_run_time, first_run_bytes = await session.rerun()
+    print(f"First run: {first_run_time * 1000:.0f} ms, {first_run_bytes / 1024:.0f} KB")
+
+    print(f"{'interaction':<75}{'full ms':>10}{'fragment ms':>13}{'full KB':>10}{'fragment KB':>13}")
+    for label, option in INTERACTIONS:
+        default_option = session.selectboxes[label][1][0]
+        results = {True: [], False: []}
+        for repeat in range(repeats):
+            for fragment in [False, True]:
+                for value in [option, default_option]:
+                    results[fragment].append(await session.select(label, value, fragment))
+        full, partial = results[False], results[True]
+        print(
+            f"{label + ' ' + option:<75}"
+            f"{statistics.median(t for t, _ in full) * 1000:>10.0f}{statistics.median(t for t, _ in partial) * 1000:>13.0f}"
+            f"{statistics.median(b for _, b in full) / 1024:>10.0f}{statistics.median(b for _, b in partial) / 1024:>13.0f}"
+        )
+    connection.close()
+
+
+# 4a: Define function to start web application on a free port (from repository root, so relative input paths resolve)
+def start_app(backend):
+    with socket.socket() as free_socket:
+        free_socket.bind(("localhost", 0))
+        port = free_socket.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_FILE, "--server.headless", "true", "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        env=dict(os.environ, LFB_BACKEND=backend), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://localhost:{port}"
+    for attempt in range(120):
+        try:
+            urllib.request.urlopen(url + "/_stcore/health")
+            return process, url
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Web application did not start within 60 s")
+
+
+
+# Step 5: Run benchmark from repository root ("python benchmarks/interaction_times.py", or --url of a running app) ----------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure chart dropdown interactions as full reruns (before fragments) and as fragment reruns")
+    parser.add_argument("--url", help="URL of running web application (started by the benchmark if omitted)")
+    parser.add_argument("--backend", default=os.environ.get("LFB_BACKEND", "memory"))
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    process, url = (None, args.url) if args.url else start_app(args.backend)
+    try:
+        IOLoop.current().run_sync(lambda: measure(url, args.repeats), timeout=3600)
+    finally:
+        if process is not None:
+            process.terminate()
@@ -0,0 +1,68 @@
+# FIRECRACKER - BENCHMARK OF BOROUGH MAP PAYLOAD
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import gzip
+import os
+import statistics
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from borough_map import read_boundaries, build_map, geojson_to_topology, topology_to_geojson, polygons, GEOJSON_FILE
+
+
+
+# Step 2: Define function to measure payload size and render time of map built from given boundaries ------------------------------------------------------------------
+def measure(boundaries, repeats):
+    # Use one value per borough so every borough is coloured and has a tooltip
+    names = list(boundaries["features_by_name"])
+    data_to_plot = pd.DataFrame({"IncGeo_BoroughName": names, "Data": range(len(names))})
+    tooltips = {name: f"{value:,}" for name, value in zip(names, range(len(names)))}
+
+    # Time building and rendering the map HTML (what the dashboard sends to the browser)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        html = build_map(boundaries, data_to_plot, tooltips, names[0]).get_root().render()
+        timings.append(time.perf_counter() - start)
+
+    points = sum(len(ring) for feature in boundaries["geojson"]["features"] for polygon in polygons(feature["geometry"]) for ring in polygon)
+    return {
+        "points": points,
+        "payload_kb": len(html.encode()) / 1024,
+        "gzip_kb": len(gzip.compress(html.encode())) / 1024,
+        "render_ms": statistics.median(timings) * 1000
+    }
+
+
+
+# Step 3: Define function to compare full GeoJSON with simplified GeoJSON and TopoJSON at several tolerances ----------------------------------------------------------
+def run(tolerances, repeats):
+    full = read_boundaries(GEOJSON_FILE)
+    variants = [("geojson (full)", full)]
+    for tolerance in tolerances:
+        topology = geojson_to_topology(full["geojson"], tolerance)
+        simplified = topology_to_geojson(topology)
+        features_by_name = {feature["properties"]["name"]: feature for feature in simplified["features"]}
+        variants.append((f"geojson (tolerance {tolerance})", {"geojson": simplified, "features_by_name": features_by_name}))
+        variants.append((f"topojson (tolerance {tolerance})", {"geojson": simplified, "topology": topology, "features_by_name": features_by_name}))
+
+    baseline = None
+    print(f"{'variant':<32}{'points':>8}{'payload KB':>12}{'gzip KB':>10}{'render ms':>11}{'payload %':>11}")
+    for name, boundaries in variants:
+        result = measure(boundaries, repeats)
+        baseline = baseline or result
+        share = result["payload_kb"] / baseline["payload_kb"] * 100
+        print(f"{name:<32}{result['points']:>8}{result['payload_kb']:>12.1f}{result['gzip_kb']:>10.1f}{result['render_ms']:>11.1f}{share:>10.0f}%")
+
+
+
+# Step 4: Run benchmark from repository root ("python benchmarks/map_payload.py") -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare payload size and render time of borough map geometries")
+    parser.add_argument("--tolerances", type=float, nargs="+", default=[0.0, 0.0005, 0.001, 0.002])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    run(args.tolerances, args.repeats)
@@ -0,0 +1,56 @@
+# FIRECRACKER - SCALING OF PARALLEL FILTER ENGINE WITH NUMBER OF WORKERS
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_loader import read_manifest, load_records
+from filter_engine import FilterEngine, ParallelFilterEngine
+from backend_parity import SELECTIONS, GROUP_COLUMNS
+
+
+
+# Step 2: Define function to time cube build and aggregations of all selections on one engine (cache cleared, so every aggregation is computed) -----------------------
+def time_engine(create, repeats):
+    start = time.perf_counter()
+    engine = create()
+    build_time = time.perf_counter() - start
+
+    # Run aggregations once to start workers and map column store in each of them
+    engine.time_histogram(*SELECTIONS[0], GROUP_COLUMNS[SELECTIONS[0][2]])
+    start = time.perf_counter()
+    for repeat in range(repeats):
+        engine.cache.clear()
+        for selection in SELECTIONS:
+            engine.time_histogram(*selection, GROUP_COLUMNS[selection[2]])
+            engine.category_counts(*selection, "Grouped_PropertyCategory")
+            engine.category_counts(*selection, "PropertyType")
+    return build_time, (time.perf_counter() - start) / repeats
+
+
+
+# Step 3: Define function to compare in-memory engine with parallel engine for growing numbers of workers -------------------------------------------------------------
+def run(worker_counts, repeats):
+    manifest = read_manifest()
+    records = load_records(manifest)
+    print(f"{len(records):,} records, {os.cpu_count()} cores")
+    print(f"{'engine':<20}{'cube build s':>14}{'speedup':>9}{'aggregations ms':>17}{'speedup':>9}")
+    base_build, base_queries = time_engine(lambda: FilterEngine(records, version=manifest["version"]), repeats)
+    print(f"{'memory':<20}{base_build:>14.2f}{1:>9.2f}{base_queries * 1000:>17.1f}{1:>9.2f}")
+    for workers in worker_counts:
+        build_time, query_time = time_engine(lambda: ParallelFilterEngine(records, version=manifest["version"], workers=workers), repeats)
+        print(f"{f'parallel {workers}':<20}{build_time:>14.2f}{base_build / build_time:>9.2f}{query_time * 1000:>17.1f}{base_queries / query_time:>9.2f}")
+
+
+
+# Step 4: Run benchmark from directory of record store ("python benchmarks/parallel_scaling.py --workers 1 2 4 8") ----------------------------------------------------
+if __name__ == "__main__":
+    default_workers = [workers for workers in [1, 2, 4, 8, 16, 32, 64] if workers <= (os.cpu_count() or 1)]
+    parser = argparse.ArgumentParser(description="Time cube build and aggregations of the parallel filter engine for several numbers of workers")
+    parser.add_argument("--workers", nargs="+", type=int, default=default_workers)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.workers, args.repeats)
@@ -0,0 +1,109 @@
+# FIRECRACKER - SYNTHETIC LFB-SHAPED RECORDS
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from borough_map import GEOJSON_FILE
+from schema import SOURCE_DTYPES, MONTH_ORDER, DAY_OF_WEEK_ORDER
+
+
+
+# Step 2: Define size and value distributions of synthetic records (1x is about the number of incidents attended by the LFB per year) ---------------------------------
+BASE_ROWS_PER_YEAR = 110000
+CHUNK_ROWS = 1000000
+SOURCE_YEARS = [(2009, 2013), (2014, 2018), (2019, 2023)]
+SOURCE_FILES = [f"input/reduced_records_{first_year}_{last_year}.csv" for first_year, last_year in SOURCE_YEARS]
+INCIDENT_GROUPS = {"False Alarm": 0.48, "Special Service": 0.33, "Fire": 0.19}
+STOP_CODES = {
+    "False Alarm": ["AFA", "False alarm - Good intent", "False alarm - Malicious"],
+    "Special Service": ["Special Service"],
+    "Fire": ["Primary Fire", "Secondary Fire", "Chimney Fire", "Late Call"]
+}
+SPECIAL_SERVICE_TYPES = ["Flooding", "RTC", "Effecting entry/exit", "Lift Release", "Assist other agencies", "Other"]
+PROPERTY_CATEGORIES = ["Dwelling", "Non Residential", "Outdoor", "Road Vehicle", "Outdoor Structure", "Other Residential", "Other"]
+PROPERTY_TYPES = [f"Property Type {number}" for number in range(1, 61)]
+PROPERTY_TYPE_SHARES = np.linspace(2, 0.1, len(PROPERTY_TYPES)) / np.linspace(2, 0.1, len(PROPERTY_TYPES)).sum()
+
+
+# 2a: Define function to read borough names from borough boundaries (so every synthetic borough appears on the map)
+def borough_names(path=os.path.join(REPO_DIR, GEOJSON_FILE)):
+    with open(path) as file:
+        return [feature["properties"]["name"] for feature in json.load(file)["features"]]
+
+
+
+# Step 3: Define function to generate one chunk of records of a year with the columns of the reduced records ----------------------------------------------------------
+def generate_chunk(rng, year, rows, boroughs):
+    incident_groups = rng.choice(list(INCIDENT_GROUPS), rows, p=list(INCIDENT_GROUPS.values()))
+    stop_codes = np.empty(rows, dtype=object)
+    for incident_group, codes in STOP_CODES.items():
+        selected = incident_groups == incident_group
+        stop_codes[selected] = rng.choice(codes, selected.sum())
+    special_service_types = np.where(incident_groups == "Special Service", rng.choice(SPECIAL_SERVICE_TYPES, rows), None)
+    months = rng.integers(0, 12, rows)
+
+    # Draw response times (turnout and travel add up to attendance time, some times are missing)
+    turnout_times = rng.normal(70, 15, rows).clip(0).round()
+    travel_times = rng.gamma(4, 60, rows).round()
+    attendance_times = turnout_times + travel_times
+    attendance_times[rng.random(rows) < 0.02] = np.nan
+    records = pd.DataFrame({
+        "CalYear": year,
+        "Quarter_Year": [f"Q{quarter}_{year}" for quarter in months // 3 + 1],
+        "Month": np.array(MONTH_ORDER)[months],
+        "DayOfWeek": rng.choice(DAY_OF_WEEK_ORDER, rows),
+        "HourOfCall": rng.integers(0, 24, rows),
+        "IncidentGroup": incident_groups,
+        "StopCodeDescription": stop_codes,
+        "Grouped_SpecialServiceType": special_service_types,
+        "Grouped_PropertyCategory": rng.choice(PROPERTY_CATEGORIES, rows),
+        "PropertyType": rng.choice(PROPERTY_TYPES, rows, p=PROPERTY_TYPE_SHARES),
+        "IncGeo_BoroughName": rng.choice(boroughs, rows),
+        "Grouped_DelayType": rng.choice(["Delayed", "Not Delayed"], rows, p=[0.1, 0.9]),
+        "FirstPumpArriving_AttendanceTime": attendance_times,
+        "TravelTimeSeconds": travel_times,
+        "TurnoutTimeSeconds": turnout_times,
+        "PumpMinutesRounded": rng.choice([60.0, 120.0, 180.0, 240.0], rows, p=[0.7, 0.2, 0.07, 0.03])
+    })
+    return records[list(SOURCE_DTYPES)]
+
+
+
+# Step 4: Define function to write CSV extracts of synthetic records into a directory (same files as the real extracts, written chunk by chunk) -----------------------
+def generate(directory, rows_per_year=BASE_ROWS_PER_YEAR, seed=0):
+    rng = np.random.default_rng(seed)
+    boroughs = borough_names()
+    for path, (first_year, last_year) in zip(SOURCE_FILES, SOURCE_YEARS):
+        target = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(f"{target}.tmp", "w", newline="") as file:
+            header = True
+            for year in range(first_year, last_year + 1):
+                for start in range(0, rows_per_year, CHUNK_ROWS):
+                    generate_chunk(rng, year, min(CHUNK_ROWS, rows_per_year - start), boroughs).to_csv(file, index=False, header=header)
+                    header = False
+        os.replace(f"{target}.tmp", target)
+
+    # Copy borough boundaries so the web application can be started in the directory
+    shutil.copyfile(os.path.join(REPO_DIR, GEOJSON_FILE), os.path.join(directory, GEOJSON_FILE))
+    return rows_per_year * sum(last_year - first_year + 1 for first_year, last_year in SOURCE_YEARS)
+
+
+
+# Step 5: Generate synthetic extracts from repository root ("python benchmarks/synthetic_data.py DIRECTORY --scale 10") -----------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write CSV extracts of synthetic LFB-shaped records into DIRECTORY/input")
+    parser.add_argument("directory")
+    parser.add_argument("--scale", type=float, default=1, help="multiple of the real record count")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rows = generate(args.directory, int(BASE_ROWS_PER_YEAR * args.scale), args.seed)
+    print(f"Wrote {rows:,} synthetic records to {os.path.join(args.directory, 'input')}")
@@ -0,0 +1,282 @@
+# FIRECRACKER - BOROUGH MAP
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import json
+import math
+import os
+import folium
+from caching import LRUCache, DiskCache, CACHE_DIR, file_hash
+
+
+
+# Step 2: Define boundary file and map settings -----------------------------------------------------------------------------------------------------------------------
+GEOJSON_FILE = "input/london-boroughs.geojson"
+TOPOJSON_FILE = "input/london-boroughs.topojson"
+TOPOJSON_OBJECT = "boroughs"
+# Default tolerance in degrees (about 70-110 m) removes about 15% of points (0.0005 removes hardly any), boroughs look the same at dashboard zoom
+SIMPLIFY_TOLERANCE = 0.001
+MAP_LOCATION = [51.50, -0.10]
+MAP_TILES = "CartoDB positron"
+
+# Set LFB_MAP_CACHE_MB to the size limit of rendered maps kept on disk (0 disables the cache)
+MAP_CACHE_DIR = os.path.join(CACHE_DIR, "maps")
+MAP_CACHE_MB = float(os.environ.get("LFB_MAP_CACHE_MB", 256))
+
+
+
+# Step 3: Define function to read borough boundaries (GeoJSON or simplified TopoJSON) and index them by borough name --------------------------------------------------
+def read_boundaries(path=GEOJSON_FILE):
+    with open(path) as file:
+        data = json.load(file)
+    if data["type"] == "Topology":
+        boundaries = {"geojson": topology_to_geojson(data), "topology": data}
+    else:
+        boundaries = {"geojson": data}
+    boundaries["features_by_name"] = {feature["properties"]["name"]: feature for feature in boundaries["geojson"]["features"]}
+    boundaries["checksum"] = file_hash([path])
+    return boundaries
+
+
+# 3a: Define function to load borough boundaries once per process (shared read-only by all sessions and the warm-up thread)
+BOUNDARY_CACHE = LRUCache(maxsize=2)
+
+
+def load_boundaries(path=GEOJSON_FILE):
+    return BOUNDARY_CACHE.get_or_compute(path, lambda: read_boundaries(path))
+
+
+
+# Step 4: Define functions to build map from cached boundaries --------------------------------------------------------------------------------------------------------
+# 4a: Define function to copy features with additional properties per borough (geometry is shared with the cached boundaries and never modified)
+def with_properties(features, values, property_name="data"):
+    copied_features = []
+    for feature in features:
+        properties = dict(feature["properties"])
+        if properties["name"] in values:
+            properties[property_name] = values[properties["name"]]
+        copied_features.append({**feature, "properties": properties})
+    return copied_features
+
+
+# 4b: Define function to build choropleth map with tooltips and highlighted borough
+def build_map(boundaries, data_to_plot, tooltips, borough_name):
+    # Initialize map with focus on London
+    map = folium.Map(location=MAP_LOCATION, scrollWheelZoom=False, tiles=MAP_TILES)
+
+    # Highlight selected borough
+    if borough_name in boundaries["features_by_name"]:
+        folium.GeoJson(
+            boundaries["features_by_name"][borough_name],
+            style_function=lambda x: {"color": "red", "weight": 8, "fillOpacity": 0}
+        ).add_to(map)
+
+    # Create choropleth map with borough values injected as tooltip property (from shared arcs if boundaries are TopoJSON)
+    if "topology" in boundaries:
+        topology = boundaries["topology"]
+        geometries = topology["objects"][TOPOJSON_OBJECT]["geometries"]
+        geo_data = {**topology, "objects": {TOPOJSON_OBJECT: {"type": "GeometryCollection", "geometries": with_properties(geometries, tooltips)}}}
+        topojson = f"objects.{TOPOJSON_OBJECT}"
+    else:
+        geo_data = {"type": "FeatureCollection", "features": with_properties(boundaries["geojson"]["features"], tooltips)}
+        topojson = None
+    choropleth = folium.Choropleth(
+        geo_data=geo_data,
+        topojson=topojson,
+        data=data_to_plot,
+        columns=["IncGeo_BoroughName", "Data"],
+        key_on="feature.properties.name",
+        line_opacity=0.8,
+        highlight=True
+    ).add_to(map)
+    choropleth.geojson.add_child(
+        folium.features.GeoJsonTooltip(["name", "data"], labels=False)
+    )
+    return map
+
+
+# 4c: Define function to return HTML of rendered map from disk cache shared by all sessions and processes (one file per user selection)
+# Cache version combines data version, boundary file and code of this module, so regenerated boundaries or changed map styling are not served from older files
+MAP_CACHE = DiskCache(MAP_CACHE_DIR, int(MAP_CACHE_MB * 2**20))
+MAP_CODE_VERSION = file_hash([os.path.abspath(__file__)])
+
+
+def cached_map_html(version, boundaries, key, build):
+    if version is None or MAP_CACHE_MB <= 0:
+        return build().get_root().render()
+    return MAP_CACHE.get_or_compute(f"{version}-{boundaries['checksum']}-{MAP_CODE_VERSION}", key, lambda: build().get_root().render())
+
+
+
+# Step 5: Define functions to simplify boundaries into quantized TopoJSON with shared arcs ----------------------------------------------------------------------------
+# 5a: Define function to iterate over polygons of a GeoJSON geometry
+def polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    return geometry["coordinates"]
+
+
+# 5b: Define function to quantize ring to integer grid (without closing point and consecutive duplicates)
+def quantize_ring(ring, translate, scale):
+    points = []
+    for x, y in ring[:-1]:
+        point = (round((x - translate[0]) / scale[0]), round((y - translate[1]) / scale[1]))
+        if not points or point != points[-1]:
+            points.append(point)
+    while len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+# 5c: Define function to find junctions, i.e. points where neighbouring rings stop sharing a boundary
+def find_junctions(rings):
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        for i, point in enumerate(ring):
+            pair = frozenset([ring[i - 1], ring[(i + 1) % len(ring)]])
+            if neighbours.setdefault(point, pair) != pair:
+                junctions.add(point)
+    return junctions
+
+
+# 5d: Define function to cut ring into arcs at junctions (rings without junctions start at their smallest point)
+def cut_ring(ring, junctions):
+    cuts = [i for i, point in enumerate(ring) if point in junctions]
+    if not cuts:
+        start = ring.index(min(ring))
+        rotated = ring[start:] + ring[:start]
+        return [rotated + [rotated[0]]]
+    rotated = ring[cuts[0]:] + ring[:cuts[0]]
+    cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+    rotated = rotated + [rotated[0]]
+    return [rotated[cuts[i]:cuts[i + 1] + 1] for i in range(len(cuts) - 1)]
+
+
+# 5e: Define function to simplify open line with Douglas-Peucker algorithm (endpoints are kept so shared arcs stay aligned)
+def douglas_peucker(points, tolerance, scale):
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = points[first], points[last]
+        dx, dy = (x2 - x1) * scale[0], (y2 - y1) * scale[1]
+        length = math.hypot(dx, dy)
+        max_distance, index = 0, None
+        for i in range(first + 1, last):
+            px, py = (points[i][0] - x1) * scale[0], (points[i][1] - y1) * scale[1]
+            distance = abs(dx * py - dy * px) / length if length else math.hypot(px, py)
+            if distance > max_distance:
+                max_distance, index = distance, i
+        if index is not None and max_distance > tolerance:
+            keep[index] = True
+            stack += [(first, index), (index, last)]
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+# 5f: Define function to simplify arc (closed arcs are split at their farthest point and keep at least a triangle)
+def simplify_arc(arc, tolerance, scale):
+    if tolerance <= 0 or len(arc) < 3:
+        return arc
+    if arc[0] != arc[-1]:
+        return douglas_peucker(arc, tolerance, scale)
+    far = max(range(len(arc)), key=lambda i: math.hypot((arc[i][0] - arc[0][0]) * scale[0], (arc[i][1] - arc[0][1]) * scale[1]))
+    simplified = douglas_peucker(arc[:far + 1], tolerance, scale)[:-1] + douglas_peucker(arc[far:], tolerance, scale)
+    return simplified if len(simplified) >= 4 else arc
+
+
+# 5g: Define function to convert GeoJSON feature collection into simplified, quantized TopoJSON
+def geojson_to_topology(geojson, tolerance=SIMPLIFY_TOLERANCE, quantization=100000):
+    # Define transform from bounding box of all coordinates
+    coordinates = [point for feature in geojson["features"] for polygon in polygons(feature["geometry"]) for ring in polygon for point in ring]
+    x_min, y_min = min(x for x, y in coordinates), min(y for x, y in coordinates)
+    x_max, y_max = max(x for x, y in coordinates), max(y for x, y in coordinates)
+    translate = [x_min, y_min]
+    scale = [(x_max - x_min) / (quantization - 1), (y_max - y_min) / (quantization - 1)]
+
+    # Quantize rings and find junctions across all boroughs
+    quantized = [[[quantize_ring(ring, translate, scale) for ring in polygon] for polygon in polygons(feature["geometry"])] for feature in geojson["features"]]
+    junctions = find_junctions([ring for feature in quantized for polygon in feature for ring in polygon])
+
+    # Cut rings into arcs, store each shared arc once and refer to reversed arcs with negative (~) indexes
+    arcs, arc_indexes, geometries = [], {}, []
+    for feature, feature_polygons in zip(geojson["features"], quantized):
+        polygon_arcs = []
+        for polygon in feature_polygons:
+            ring_arcs = []
+            for ring in polygon:
+                ring_arc_indexes = []
+                for arc in cut_ring(ring, junctions):
+                    key, reversed_key = tuple(arc), tuple(reversed(arc))
+                    if key in arc_indexes:
+                        ring_arc_indexes.append(arc_indexes[key])
+                    elif reversed_key in arc_indexes:
+                        ring_arc_indexes.append(~arc_indexes[reversed_key])
+                    else:
+                        arc_indexes[key] = len(arcs)
+                        ring_arc_indexes.append(len(arcs))
+                        arcs.append(arc)
+                ring_arcs.append(ring_arc_indexes)
+            polygon_arcs.append(ring_arcs)
+        geometry_type = feature["geometry"]["type"]
+        geometries.append({
+            "type": geometry_type,
+            "arcs": polygon_arcs[0] if geometry_type == "Polygon" else polygon_arcs,
+            "properties": feature["properties"]
+        })
+
+    # Simplify each arc once and delta-encode its points
+    encoded_arcs = []
+    for arc in arcs:
+        simplified = simplify_arc(arc, tolerance, scale)
+        encoded_arcs.append([list(simplified[0])] + [[x2 - x1, y2 - y1] for (x1, y1), (x2, y2) in zip(simplified, simplified[1:])])
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": scale, "translate": translate},
+        "objects": {TOPOJSON_OBJECT: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": encoded_arcs
+    }
+
+
+# 5h: Define function to decode TopoJSON back into GeoJSON feature collection
+def topology_to_geojson(topology):
+    scale, translate = topology["transform"]["scale"], topology["transform"]["translate"]
+    decoded_arcs = []
+    for arc in topology["arcs"]:
+        x, y, points = 0, 0, []
+        for dx, dy in arc:
+            x, y = x + dx, y + dy
+            points.append([round(x * scale[0] + translate[0], 6), round(y * scale[1] + translate[1], 6)])
+        decoded_arcs.append(points)
+
+    def decode_ring(arc_indexes):
+        ring = []
+        for index in arc_indexes:
+            points = decoded_arcs[index] if index >= 0 else decoded_arcs[~index][::-1]
+            ring += points if not ring else points[1:]
+        return ring
+
+    features = []
+    for geometry in topology["objects"][TOPOJSON_OBJECT]["geometries"]:
+        if geometry["type"] == "Polygon":
+            coordinates = [decode_ring(ring) for ring in geometry["arcs"]]
+        else:
+            coordinates = [[decode_ring(ring) for ring in polygon] for polygon in geometry["arcs"]]
+        features.append({"type": "Feature", "geometry": {"type": geometry["type"], "coordinates": coordinates}, "properties": geometry["properties"]})
+    return {"type": "FeatureCollection", "features": features}
+
+
+
+# Step 6: Define preprocessing step to write simplified TopoJSON (used by the web application when present) -----------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simplify borough boundaries into quantized TopoJSON")
+    parser.add_argument("--tolerance", type=float, default=SIMPLIFY_TOLERANCE, help="simplification tolerance in degrees (0 keeps all points and only shares arcs, 0.002 removes about 40%% of points)")
+    parser.add_argument("--quantization", type=int, default=100000, help="number of grid steps per axis")
+    args = parser.parse_args()
+
+    topology = geojson_to_topology(read_boundaries(GEOJSON_FILE)["geojson"], args.tolerance, args.quantization)
+    with open(TOPOJSON_FILE, "w") as file:
+        json.dump(topology, file, separators=(",", ":"))
+    print(f"Wrote {len(topology['arcs'])} arcs to {TOPOJSON_FILE}")
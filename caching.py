@@ -0,0 +1,152 @@
+# FIRECRACKER - CACHING
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+from collections import OrderedDict
+
+
+
+# Step 2: Define thread-safe in-memory cache with least-recently-used eviction ----------------------------------------------------------------------------------------
+class LRUCache:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    # 2a: Define function to return cached value or compute and store it (computed outside lock so sessions do not block each other)
+    def get_or_compute(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        value = compute()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    # 2b: Define function to drop all cached values
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+
+# Step 3: Define disk cache of pickled values bounded by total size (kept between restarts and shared by processes, one directory per data version) -------------------
+# Set LFB_CACHE_DIR to a directory shared by all replicas so a freshly started replica serves cached results immediately
+CACHE_DIR = os.environ.get("LFB_CACHE_DIR", "input/cache")
+# Files are only listed when the running total of cached bytes exceeds the limit or every SCAN_WRITES writes (to count files written by other processes)
+SCAN_WRITES = 256
+LOW_WATER = 0.8
+
+
+class DiskCache:
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = None
+        self.lock = threading.Lock()
+        self.total_bytes = None
+        self.writes = 0
+
+    # 3a: Define function to switch to a data version (once this process sees the data change, directories of other versions are removed, otherwise they are evicted)
+    def use_version(self, version):
+        with self.lock:
+            if self.version is not None and version != self.version and os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name != version:
+                        shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+                self.total_bytes = None
+            self.version = version
+
+    # 3b: Define function to return cached value or compute and store it (files are only replaced atomically, so processes never read half-written values)
+    def get_or_compute(self, version, key, compute):
+        self.use_version(version)
+        path = os.path.join(self.directory, version, hashlib.sha256(repr(key).encode()).hexdigest())
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+            return pickle.loads(data)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError, ValueError):
+            # Missing, just evicted or written by incompatible code or library versions: compute again
+            pass
+        value = compute()
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) <= self.max_bytes:
+            self.store(path, data)
+        return value
+
+    # 3c: Define function to write value under unique temporary name and remove least recently used files of all processes once running total exceeds size limit (down to low-water mark)
+    def store(self, path, data):
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except OSError:
+            # Directory removed by a process that saw a newer data version
+            return
+        with self.lock:
+            self.writes += 1
+            if self.total_bytes is None or self.writes >= SCAN_WRITES:
+                self.total_bytes = sum(size for mtime, size, entry_path in self.entries())
+                self.writes = 0
+            else:
+                self.total_bytes += len(data)
+            if self.total_bytes <= self.max_bytes:
+                return
+            entries = self.entries()
+            total_bytes = sum(size for mtime, size, entry_path in entries)
+            for mtime, size, entry_path in sorted(entries):
+                if total_bytes <= self.max_bytes * LOW_WATER:
+                    break
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
+            self.total_bytes = total_bytes
+            self.writes = 0
+
+    # 3d: Define function to list modification time, size and path of cached files of all processes and data versions
+    def entries(self):
+        entries = []
+        for directory, names in walk_files(self.directory):
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(directory, name)))
+        return entries
+
+    # 3e: Define function to remove all cached files
+    def clear(self):
+        with self.lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.version = None
+            self.total_bytes = None
+
+
+# 3f: Define function to list cached files of all data versions (temporary files of unfinished writes are skipped)
+def walk_files(directory):
+    for version_dir, subdirs, names in os.walk(directory):
+        yield version_dir, [name for name in names if not name.endswith(".tmp")]
+
+
+
+# Step 4: Define function to hash contents of files (cache versions change when code or input files of cached results change) -----------------------------------------
+def file_hash(paths):
+    contents_hash = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as file:
+            contents_hash.update(file.read())
+    return contents_hash.hexdigest()[:12]
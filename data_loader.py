@@ -0,0 +1,284 @@
+# FIRECRACKER - DATA LOADER
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import os
+import glob
+import json
+import argparse
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from schema import SOURCE_DTYPES, CSV_DTYPES, apply_schema, concat_records
+from instrumentation import stage, current_run, join_run, end_run
+
+
+
+# Step 2: Define input files and partitioned record store -------------------------------------------------------------------------------------------------------------
+# New yearly extracts matching the pattern are picked up without code changes, ingested extracts are listed in the manifest
+SOURCE_PATTERN = "input/reduced_records_*.csv"
+STORE_DIR = "input/records"
+MANIFEST_FILE = os.path.join(STORE_DIR, "manifest.json")
+COLUMNS_DIR = os.path.join(STORE_DIR, "columns")
+# Columns filtered by the dashboard, stored with row positions ordered by category so filter engines map their index instead of building it
+INDEX_COLUMNS = ["IncidentGroup", "IncGeo_BoroughName"]
+CHUNK_ROWS = 250000
+
+
+
+# Step 3: Define functions to read records from CSV extracts (read concurrently, one thread per extract, as the CSV parser releases the GIL) --------------------------
+# 3a: Define function to find CSV extracts matching paths or glob patterns (sorted by name, each extract once)
+def find_source_files(patterns=(SOURCE_PATTERN,)):
+    paths = []
+    for pattern in patterns:
+        paths += sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+    return list(dict.fromkeys(paths))
+
+
+# 3b: Define function to read one raw CSV extract (timed per file)
+def read_source_file(path):
+    with stage(f"read_source_file: {os.path.basename(path)}") as measurement:
+        records = pd.read_csv(path, usecols=list(SOURCE_DTYPES), dtype=CSV_DTYPES)
+        measurement["rows"] = len(records)
+        return apply_schema(records[list(SOURCE_DTYPES)])
+
+
+# 3c: Define function to read CSV extracts concurrently in the order of the paths
+def map_source_files(paths):
+    run = current_run()
+
+    def read(path):
+        join_run(run)
+        try:
+            return read_source_file(path)
+        finally:
+            end_run()
+    with ThreadPoolExecutor(max(len(paths), 1)) as executor:
+        return list(executor.map(read, paths))
+
+
+# 3d: Define function to read and merge all raw CSV extracts (extracts are not tracked, so a fresh checkout has none)
+def read_source_files(paths=None):
+    if paths is None:
+        paths = find_source_files()
+        if not paths:
+            raise FileNotFoundError(f"No CSV extracts match {SOURCE_PATTERN}")
+    return concat_records(map_source_files(paths))
+
+
+
+# Step 4: Define functions to read record store (one Parquet file per year, listed with checksums in manifest) --------------------------------------------------------
+# 4a: Define function to read manifest (empty manifest if store was not created yet)
+def read_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {"version": None, "sources": {}, "partitions": {}}
+    with open(MANIFEST_FILE) as file:
+        return json.load(file)
+
+
+# 4b: Define function to find years whose partition was added, changed or removed between two manifests
+def changed_partitions(old_manifest, new_manifest):
+    old_partitions, new_partitions = old_manifest["partitions"], new_manifest["partitions"]
+    changed_years = [int(year) for year, partition in new_partitions.items() if old_partitions.get(year, {}).get("checksum") != partition["checksum"]]
+    removed_years = [int(year) for year in old_partitions if year not in new_partitions]
+    return sorted(changed_years), sorted(removed_years)
+
+
+# 4c: Define function to read partitions of the given years
+def read_partitions(manifest, years):
+    return {year: pd.read_parquet(os.path.join(STORE_DIR, manifest["partitions"][str(year)]["file"])) for year in years}
+
+
+# 4d: Define function to read and merge all partitions in year order
+def read_store(manifest):
+    partitions = read_partitions(manifest, sorted(int(year) for year in manifest["partitions"]))
+    return concat_records(partitions.values())
+
+
+# 4e: Define function to load records from memory-mapped column store, record store or CSV extracts (in this order)
+def load_records(manifest=None):
+    manifest = read_manifest() if manifest is None else manifest
+    if not manifest["partitions"]:
+        return read_source_files()
+    records = map_column_store(manifest["version"])
+    if records is None:
+        records = read_store(manifest)
+    return records
+
+
+
+# Step 5: Define functions to ingest new or changed CSV extracts into record store and column store (run after each data update) --------------------------------------
+# 5a: Define functions to calculate checksums of files and partitions
+def file_checksum(path):
+    checksum = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def partition_checksum(partition):
+    return hashlib.sha256(pd.util.hash_pandas_object(partition, index=False).to_numpy().tobytes()).hexdigest()
+
+
+# 5b: Define functions to write files atomically so running dashboards never read half-written files
+def write_atomically(path, write):
+    temporary_path = f"{path}.tmp"
+    write(temporary_path)
+    os.replace(temporary_path, path)
+
+
+def write_manifest(manifest, path):
+    with open(path, "w") as file:
+        json.dump(manifest, file, indent=2)
+
+
+# 5c: Define function to ingest CSV extracts matching paths or patterns and all extracts listed in manifest (unchanged extracts are skipped and only partitions with new checksums are written)
+def ingest_source_files(patterns=(SOURCE_PATTERN,), column_store=True):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    manifest = read_manifest()
+    changed_years = []
+    paths = find_source_files([path for path in manifest["sources"] if os.path.exists(path)] + find_source_files(patterns))
+    removed_paths = [path for path in manifest["sources"] if not os.path.exists(path)]
+
+    # Skip extracts whose size and modification time, or at least checksum, are unchanged (changed extracts are read concurrently)
+    updated_sources = {}
+    for path in paths:
+        stat = os.stat(path)
+        source = manifest["sources"].get(path, {})
+        if source.get("size") != stat.st_size or source.get("mtime") != stat.st_mtime:
+            updated_sources[path] = (stat, file_checksum(path))
+    changed_paths = [path for path, (stat, checksum) in updated_sources.items() if manifest["sources"].get(path, {}).get("checksum") != checksum]
+    changed_records = dict(zip(changed_paths, map_source_files(changed_paths)))
+    for path, (stat, checksum) in updated_sources.items():
+        source = manifest["sources"].get(path, {})
+        if path in changed_records:
+            # Split extract into years and write partitions whose content changed
+            records = changed_records.pop(path)
+            years = [int(year) for year in records["CalYear"].unique()]
+            for year, partition in records.groupby("CalYear", sort=True):
+                partition = partition.reset_index(drop=True)
+                for column in partition.select_dtypes("category"):
+                    partition[column] = partition[column].cat.remove_unused_categories()
+                partition_state = {"file": f"{year}.parquet", "rows": len(partition), "checksum": partition_checksum(partition)}
+                if manifest["partitions"].get(str(year), {}).get("checksum") != partition_state["checksum"]:
+                    write_atomically(os.path.join(STORE_DIR, partition_state["file"]), lambda target: partition.to_parquet(target, engine="pyarrow", index=False, row_group_size=CHUNK_ROWS))
+                    manifest["partitions"][str(year)] = partition_state
+                    changed_years.append(int(year))
+
+            # Remove partitions of years no longer contained in extract
+            for year in set(source.get("years", [])) - set(years):
+                removed_partition = manifest["partitions"].pop(str(year), None)
+                if removed_partition is not None:
+                    os.remove(os.path.join(STORE_DIR, removed_partition["file"]))
+                    changed_years.append(year)
+            source = {"checksum": checksum, "years": sorted(years)}
+        manifest["sources"][path] = dict(source, size=stat.st_size, mtime=stat.st_mtime)
+
+    # Remove extracts deleted from disk and partitions of their years not contained in any other extract
+    for path in removed_paths:
+        years = manifest["sources"].pop(path).get("years", [])
+        kept_years = {year for source in manifest["sources"].values() for year in source.get("years", [])}
+        for year in set(years) - kept_years:
+            removed_partition = manifest["partitions"].pop(str(year), None)
+            if removed_partition is not None:
+                os.remove(os.path.join(STORE_DIR, removed_partition["file"]))
+                changed_years.append(year)
+
+    # Write column store of new data version and update manifest last (data version changes only if partitions changed)
+    if changed_years:
+        checksums = [f"{year}:{manifest['partitions'][year]['checksum']}" for year in sorted(manifest["partitions"])]
+        manifest["version"] = hashlib.sha256("\n".join(checksums).encode()).hexdigest()
+    if column_store and manifest["version"] is not None and not os.path.exists(column_store_dir(manifest["version"])):
+        write_column_store(read_store(manifest), manifest["version"])
+    write_atomically(MANIFEST_FILE, lambda target: write_manifest(manifest, target))
+    return sorted(changed_years)
+
+
+
+
+# Step 6: Define functions to write and map column store (one .npy file per column and index column, mapped read-only by all sessions and processes) ------------------
+# 6a: Define function to return directory of column store of a data version
+def column_store_dir(version):
+    return os.path.join(COLUMNS_DIR, version)
+
+
+# 6b: Define function to write records as one .npy file per column (categorical columns as codes with categories in schema file, index columns also as int32 row positions sorted by code)
+def write_column_store(records, version):
+    temporary_dir = f"{column_store_dir(version)}.tmp"
+    shutil.rmtree(temporary_dir, ignore_errors=True)
+    os.makedirs(temporary_dir)
+    columns = []
+    for column in records.columns:
+        if isinstance(records[column].dtype, pd.CategoricalDtype):
+            np.save(os.path.join(temporary_dir, f"{column}.npy"), records[column].cat.codes.to_numpy())
+            columns.append({"name": column, "categories": list(records[column].cat.categories), "ordered": bool(records[column].cat.ordered)})
+        else:
+            np.save(os.path.join(temporary_dir, f"{column}.npy"), records[column].to_numpy())
+            columns.append({"name": column})
+    for column in INDEX_COLUMNS:
+        np.save(os.path.join(temporary_dir, f"{column}.positions.npy"), np.argsort(records[column].cat.codes.to_numpy(), kind="stable").astype(np.int32))
+    with open(os.path.join(temporary_dir, "schema.json"), "w") as file:
+        json.dump({"rows": len(records), "columns": columns}, file)
+    os.replace(temporary_dir, column_store_dir(version))
+
+    # Remove column stores older than the previous version (sessions keep the previous engine until their next full rerun and its workers may still have to map it)
+    old_versions = sorted((old_version for old_version in os.listdir(COLUMNS_DIR) if old_version != version), key=lambda old_version: os.path.getmtime(column_store_dir(old_version)))
+    previous_versions = [old_version for old_version in old_versions if not old_version.endswith(".tmp")][-1:]
+    for old_version in old_versions:
+        if old_version not in previous_versions:
+            shutil.rmtree(column_store_dir(old_version), ignore_errors=True)
+
+
+# 6c: Define function to map column store of a data version without reading it into memory (None if not written yet)
+def map_column_store(version):
+    schema_file = os.path.join(column_store_dir(version), "schema.json") if version else None
+    if schema_file is None or not os.path.exists(schema_file):
+        return None
+    with open(schema_file) as file:
+        schema = json.load(file)
+    columns = {}
+    for column in schema["columns"]:
+        values = np.load(os.path.join(column_store_dir(version), f"{column['name']}.npy"), mmap_mode="r")
+        if "categories" in column:
+            dtype = pd.CategoricalDtype(column["categories"], ordered=column["ordered"])
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        columns[column["name"]] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+# 6d: Define function to map row positions of index columns of a data version (None if column store was written without them)
+def map_position_index(version):
+    paths = {column: os.path.join(column_store_dir(version), f"{column}.positions.npy") for column in INDEX_COLUMNS} if version else {}
+    if not paths or not all(os.path.exists(path) for path in paths.values()):
+        return None
+    return {column: np.load(path, mmap_mode="r") for column, path in paths.items()}
+
+
+
+# Step 7: Define function to read records in chunks for out-of-core aggregation (year partitions of record store, otherwise CSV extracts matching pattern) ------------
+def iter_record_chunks(manifest, years=None, chunk_rows=CHUNK_ROWS):
+    if manifest["partitions"]:
+        for year in sorted(int(year) for year in manifest["partitions"]):
+            if years is None or year in years:
+                parquet_file = pq.ParquetFile(os.path.join(STORE_DIR, manifest["partitions"][str(year)]["file"]))
+                for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+                    yield batch.to_pandas()
+    else:
+        paths = find_source_files()
+        if not paths:
+            raise FileNotFoundError(f"No CSV extracts match {SOURCE_PATTERN}")
+        for path in paths:
+            for chunk in pd.read_csv(path, usecols=list(SOURCE_DTYPES), dtype=SOURCE_DTYPES, chunksize=chunk_rows):
+                yield apply_schema(chunk[list(SOURCE_DTYPES)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest new or changed CSV extracts into record store (extracts listed in manifest are checked again)")
+    parser.add_argument("paths", nargs="*", default=[SOURCE_PATTERN], help=f"CSV extracts or glob patterns (default: {SOURCE_PATTERN})")
+    parser.add_argument("--skip-column-store", action="store_true", help="do not write column store (records larger than memory, use streaming backend)")
+    args = parser.parse_args()
+    changed_years = ingest_source_files(args.paths, column_store=not args.skip_column_store)
+    print(f"Ingested {len(changed_years)} changed year partitions into {STORE_DIR}: {changed_years}")
@@ -0,0 +1,239 @@
+# FIRECRACKER - FIGURES
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import plotly.graph_objects as go
+from caching import LRUCache
+
+
+
+# Step 2: Define bounded figure cache shared by all sessions of the process -------------------------------------------------------------------------------------------
+FIGURE_CACHE = LRUCache(maxsize=128)
+
+
+# Build figure only if no figure exists for the same chart, user selection and chart option (cached figures must not be modified)
+def cached_figure(key, build_figure, *args):
+    return FIGURE_CACHE.get_or_compute(key, lambda: build_figure(*args))
+
+
+
+# Step 3: Define helper function to sort columns by total with "Other" last -------------------------------------------------------------------------------------------
+def sort_columns(pivot_table):
+    # Separate "Other" category if it exists
+    if "Other" in pivot_table.columns:
+        columns_without_other = pivot_table.drop(columns=["Other"])
+    else:
+        columns_without_other = pivot_table
+
+    # Sort columns except "Other"
+    column_totals = columns_without_other.sum(axis=0)
+    sorted_columns = column_totals.sort_values(ascending=False).index
+
+    # Reconstruct pivot_table with sorted columns and "Other" last
+    sorted_columns = sorted_columns.tolist()
+    if "Other" in pivot_table.columns:
+        sorted_columns.append("Other")
+    return pivot_table[sorted_columns]
+
+
+
+# Step 4: Define function to build development by incident group chart ------------------------------------------------------------------------------------------------
+def build_development_figure(pivot_table, chart_type, name, title, start_year, end_year, borough_name):
+    # Customize chart based on selected chart type
+    if chart_type == "Percentage":
+        hovertemplate = "%{data.name}<br>%{y:.1f}%<extra></extra>"
+        if borough_name != "All Boroughs":
+            title_prefix = f"Percentage of {name}s in {borough_name}"
+        else:
+            title_prefix = f"Percentage of {name}s by {name} {title}"
+    else:
+        hovertemplate = "%{data.name}<br>%{y:,}<extra></extra>"
+        if borough_name != "All Boroughs":
+            title_prefix = f"Number of {name}s in {borough_name}"
+        else:
+            title_prefix = f"Number of {name}s by {name} {title}"
+    pivot_table = sort_columns(pivot_table)
+
+    # Define color palette
+    palette = ["#7891AA", "#83AC9A", "#BA749F", "#C6AA3D", "#9999FF", "#B6B6B6"]
+
+    # Add traces to figure with specified colors
+    fig = go.Figure()
+    for i, col in enumerate(pivot_table.columns):
+        fig.add_trace(
+            go.Bar(
+                x=pivot_table.index,
+                y=pivot_table[col],
+                name=col,
+                marker_color=palette[i % len(palette)],
+                opacity=0.75,
+                hovertemplate=hovertemplate
+            )
+        )
+
+    # Add dynamic title
+    dynamic_title = f"{title_prefix} ({start_year})" if start_year == end_year else f"{title_prefix} ({start_year}-{end_year})"
+
+    # Define chart layout
+    fig.update_layout(
+        barmode="stack",
+        title=dynamic_title,
+        xaxis_title="Year",
+        xaxis_tickvals=pivot_table.index,
+        legend=dict( orientation="h", yanchor="top", y=-0.2, xanchor="center", x=0.5),
+        height=500
+    )
+    return fig
+
+
+
+# Step 5: Define function to build incidents by time period chart -----------------------------------------------------------------------------------------------------
+def build_time_period_figure(pivot_table, time_period, name, start_year, end_year, borough_name):
+    # Customize chart based on selected time period
+    if time_period == "Month":
+        xaxis_title = "Month"
+        period_name = "Month"
+    elif time_period == "Day of Week":
+        xaxis_title = "Day of Week"
+        period_name = "Weekday"
+    else:
+        xaxis_title = "Hour of Day"
+        period_name = "Hour"
+    if borough_name != "All Boroughs":
+        title_prefix = f"Number of {name}s per {period_name} in {borough_name}"
+    else:
+        title_prefix = f"Number of {name}s per {period_name}"
+    pivot_table = sort_columns(pivot_table)
+
+    # Define color palette
+    palette = ["#7891AA", "#83AC9A", "#BA749F", "#C6AA3D", "#9999FF", "#B6B6B6"]
+
+    # Add traces to figure
+    fig = go.Figure()
+    for i, col in enumerate(pivot_table.columns):
+        fig.add_trace(
+            go.Bar(
+                x=pivot_table.index,
+                y=pivot_table[col],
+                name=col,
+                marker_color=palette[i % len(palette)],
+                opacity=0.75,
+                hovertemplate=f"{col}<br>%{{y:,}}<extra></extra>"
+            )
+        )
+
+    # Add dynamic title
+    dynamic_title = f"{title_prefix}<br>({start_year})" if start_year == end_year else f"{title_prefix}<br>({start_year}-{end_year} aggregated)"
+
+    # Define chart layout
+    fig.update_layout(
+        barmode="stack",
+        title=dynamic_title,
+        xaxis_title=xaxis_title,
+        xaxis_tickvals=pivot_table.index,
+        legend=dict( orientation="h", yanchor="top", y=-0.2, xanchor="center", x=0.5),
+        height=450
+    )
+    return fig
+
+
+
+# Step 6: Define function to build comparison of average response times chart -----------------------------------------------------------------------------------------
+def build_average_times_figure(data, comparison_metric, start_year, end_year, incident_group, borough_name):
+    # Define common chart settings
+    name = f"{incident_group}s" if incident_group != "All Incidents" else incident_group
+
+    # Customize chart based on user selection
+    if comparison_metric == "Average Attendance Time by Component":
+        title_prefix = f"Response Times for {name} in {borough_name}" if borough_name != "All Boroughs" else f"Response Times for {name}"
+        legend_names = {"FirstPumpArriving_AttendanceTime": "Attendance Time", "TravelTimeSeconds": "Travel Time", "TurnoutTimeSeconds": "Turnout Time"}
+        y_min = 0
+        palette = ["#BA749F", "#83AC9A", "#7891AA"]
+    else:
+        title_prefix = f"Attendance Times for {name} in {borough_name}" if borough_name != "All Boroughs" else f"Attendance Times for {name}"
+        legend_names = {"False Alarm": "False Alarm", "Special Service": "Special Service", "Fire": "Fire"}
+        y_min = np.floor(data.min().min() / 50) * 50
+        if incident_group == "False Alarm":
+            palette = ["#7891AA", "#A9A9A9", "#D3D3D3"]
+        elif incident_group == "Fire":
+            palette = ["#A9A9A9", "#D3D3D3", "#BA749F"]
+        elif incident_group == "Special Service":
+            palette = ["#A9A9A9", "#83AC9A", "#D3D3D3"]
+        else:
+            palette = ["#7891AA", "#83AC9A", "#BA749F"]
+
+    # Add traces to figure
+    fig = go.Figure()
+    for i, col in enumerate(data.columns):
+        fig.add_trace(go.Scatter(
+            x=data.index,
+            y=data[col],
+            mode="lines",
+            name=legend_names.get(col, col),
+            line=dict(width=2.5, color=palette[i % len(palette)]),
+            hovertemplate=f"{legend_names.get(col, col)}<br>%{{x}}<br>%{{y:.1f}} sec<extra></extra>"
+        ))
+
+    # Add dynamic title
+    dynamic_title = f"{title_prefix}<br>({start_year}, average in seconds)" if start_year == end_year else f"{title_prefix}<br>({start_year}-{end_year}, average in seconds)"
+
+    # Calculate max y value and round up to nearest multiple of 50
+    y_max = data.max().max()
+    y_max_rounded = np.ceil(y_max / 50) * 50
+
+    # Define chart layout
+    fig.update_layout(
+        title=dynamic_title,
+        xaxis_title="Quarter",
+        yaxis=dict(dtick=50, range=[y_min, y_max_rounded]),
+        legend=dict( orientation="h", yanchor="top", y=-0.4, xanchor="center", x=0.5),
+        height=450
+    )
+    return fig
+
+
+
+# Step 7: Define function to build split by property chart ------------------------------------------------------------------------------------------------------------
+def build_property_figure(data, name_column, property_metric, start_year, end_year, incident_group, borough_name):
+    # Select colors and chart height based on property metric (categories beyond the palette are grey)
+    if property_metric == "Property Category":
+        palette = ["#7891AA", "#83AC9A", "#BA749F", "#C6AA3D", "#9999FF", "#C4A484", "#B6B6B6"]
+        chart_height = 500
+    else:
+        palette = ["#7891AA", "#83AC9A", "#BA749F", "#C6AA3D", "#9999FF", "#B6B6B6"]
+        chart_height = 538
+    names = data[name_column].to_numpy()
+    counts = data["Count"].to_numpy()
+    percentages = counts / counts.sum() * 100
+    colors = (palette + ["#B6B6B6"] * len(names))[:len(names)]
+
+    # Add one stacked bar per category to the figure at once (counts and shares are shown via a common hover template)
+    hovertemplate = "%{data.name}<br>Count: %{customdata:,.0f}<br>Share: %{y:.1f}%<extra></extra>"
+    fig = go.Figure()
+    fig.add_traces([
+        go.Bar(
+            x=[property_metric],
+            y=[percentage],
+            customdata=[count],
+            name=name,
+            marker_color=color,
+            opacity=0.75,
+            hovertemplate=hovertemplate,
+            width=0.4
+        )
+        for name, percentage, count, color in zip(names, percentages, counts, colors)
+    ])
+
+    # Add dynamic title
+    name = "Incident" if incident_group == "All Incidents" else incident_group
+    title_prefix = f"{name}s in {borough_name}" if borough_name != "All Boroughs" else f"{name}s"
+    dynamic_title = f"{title_prefix}<br>({start_year}, in %)" if start_year == end_year else f"{title_prefix}<br>({start_year}-{end_year} aggregated, in %)"
+
+    # Define chart layout
+    fig.update_layout(
+        barmode="stack",
+        title=dynamic_title,
+        legend=dict( orientation="h", yanchor="top", y=-0.1, xanchor="center", x=0.5),
+        height=chart_height
+    )
+    return fig
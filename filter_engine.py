@@ -0,0 +1,332 @@
+# FIRECRACKER - FILTER ENGINE
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import numpy as np
+from analytics import build_cube, slice_cube, merge_cubes, add_partials, time_histogram, category_counts, BoroughMatrix
+from caching import LRUCache
+from data_loader import MANIFEST_FILE, CHUNK_ROWS, read_manifest, changed_partitions, read_partitions, load_records, map_column_store, map_position_index, column_store_dir, iter_record_chunks
+from schema import concat_records
+
+
+
+# Step 2: Define helper function to group row positions by categorical codes ------------------------------------------------------------------------------------------
+# Row positions stay in ascending order within each group, so the rows of a year range can be found by binary search (int32 positions ordered by code can be passed if mapped from column store)
+def group_positions(codes, labels, order=None):
+    if order is None:
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    offsets = np.concatenate([[np.count_nonzero(codes < 0)], counts]).cumsum()
+    return {label: order[offsets[i]:offsets[i + 1]] for i, label in enumerate(labels)}
+
+
+
+# Step 3: Define index of records sorted by year ----------------------------------------------------------------------------------------------------------------------
+class RecordIndex:
+    def __init__(self, records, positions=None):
+        # Sort records by year (stable to keep original order within each year, mapped positions no longer match sorted records)
+        if not records["CalYear"].is_monotonic_increasing:
+            records = records.sort_values("CalYear", kind="stable", ignore_index=True)
+            positions = None
+        self.records = records
+        if positions is None:
+            positions = {}
+
+        # Build offset table with first row of each year and end of records
+        years = records["CalYear"].to_numpy()
+        self.years = np.unique(years)
+        self.year_offsets = np.append(np.searchsorted(years, self.years, side="left"), len(years))
+
+        # Build row positions per incident group and per borough (combinations are found by checking borough codes of the incident group rows)
+        self.borough_codes = records["IncGeo_BoroughName"].cat.codes.to_numpy()
+        self.borough_labels = {borough: code for code, borough in enumerate(records["IncGeo_BoroughName"].cat.categories)}
+        for column, attribute in [("IncidentGroup", "group_positions"), ("IncGeo_BoroughName", "borough_positions")]:
+            order = positions.get(column)
+            order = order if order is not None and len(order) == len(records) else None
+            setattr(self, attribute, group_positions(records[column].cat.codes.to_numpy(), list(records[column].cat.categories), order))
+
+    # 3a: Define function to find first and last row (exclusive) of a year range
+    def year_range(self, start_year, end_year):
+        start, end = np.searchsorted(self.years, [start_year, end_year + 1], side="left")
+        return self.year_offsets[start], self.year_offsets[end]
+
+    # 3b: Define function to find row positions of incident group and/or borough within a year range
+    def positions(self, start_year, end_year, incident_group, borough_name):
+        if incident_group != "All Incidents":
+            positions = self.group_positions.get(incident_group)
+        else:
+            positions = self.borough_positions.get(borough_name)
+        if positions is None or (borough_name != "All Boroughs" and borough_name not in self.borough_labels):
+            return np.empty(0, dtype=np.int32)
+        first_row, end_row = self.year_range(start_year, end_year)
+        positions = positions[np.searchsorted(positions, first_row):np.searchsorted(positions, end_row)]
+        if incident_group != "All Incidents" and borough_name != "All Boroughs":
+            positions = positions[self.borough_codes[positions] == self.borough_labels[borough_name]]
+        return positions
+
+    # 3c: Define function to select records matching the user selection (zero-copy slice if only years are filtered)
+    def select(self, start_year, end_year, incident_group, borough_name):
+        if incident_group == "All Incidents" and borough_name == "All Boroughs":
+            first_row, end_row = self.year_range(start_year, end_year)
+            return self.records.iloc[first_row:end_row]
+        return self.records.take(self.positions(start_year, end_year, incident_group, borough_name))
+
+
+
+# Step 4: Define base filter engine holding incident cube and memoized results per user selection (engines differ in how filtered records are aggregated) -------------
+class BaseFilterEngine:
+    def __init__(self, cube, maxsize=64, version=None):
+        self.cube = cube
+        self.borough_matrix = BoroughMatrix(cube)
+        self.cache = LRUCache(maxsize)
+        self.version = version
+
+    # 4a: Define function to memoize any result derived from a user selection (results are shared and must not be modified)
+    def memoize(self, key, compute):
+        return self.cache.get_or_compute(key, compute)
+
+    # 4b: Define function to return cube slice with all filters applied
+    def filtered_cube(self, start_year, end_year, incident_group, borough_name):
+        key = ("cube", start_year, end_year, incident_group, borough_name)
+        return self.memoize(key, lambda: slice_cube(self.cube, start_year, end_year, incident_group, borough_name))
+
+    # 4c: Define functions to return cube slices without borough filter and without incident group filter
+    def cube_without_borough(self, start_year, end_year, incident_group):
+        return self.filtered_cube(start_year, end_year, incident_group, "All Boroughs")
+
+    def cube_without_incident_group(self, start_year, end_year, borough_name):
+        return self.filtered_cube(start_year, end_year, "All Incidents", borough_name)
+
+    # 4d: Define functions to count filtered records by time period and per category of a column (memoized per user selection)
+    def time_histogram(self, start_year, end_year, incident_group, borough_name, column):
+        key = ("time_histogram", column, start_year, end_year, incident_group, borough_name)
+        return self.memoize(key, lambda: self.compute_time_histogram(start_year, end_year, incident_group, borough_name, column))
+
+    def category_counts(self, start_year, end_year, incident_group, borough_name, column):
+        key = ("category_counts", column, start_year, end_year, incident_group, borough_name)
+        return self.memoize(key, lambda: self.compute_category_counts(start_year, end_year, incident_group, borough_name, column))
+
+    # 4e: Define functions to compute counts from aggregate() of engines reading records (answered by queries in database backends)
+    def compute_time_histogram(self, start_year, end_year, incident_group, borough_name, column):
+        return self.aggregate(start_year, end_year, incident_group, borough_name, partial(time_histogram, column=column))
+
+    def compute_category_counts(self, start_year, end_year, incident_group, borough_name, column):
+        return self.aggregate(start_year, end_year, incident_group, borough_name, partial(category_counts, column=column))
+
+
+
+# Step 5: Define filter engine holding all records in memory (records indexed by year, incident group and borough) ----------------------------------------------------
+class FilterEngine(BaseFilterEngine):
+    def __init__(self, records, maxsize=64, cube=None, version=None):
+        self.index = RecordIndex(records, map_position_index(version))
+        self.records = self.index.records
+        super().__init__(self.aggregate_cube() if cube is None else cube, maxsize, version)
+
+    # 5a: Define function to build incident cube from all records
+    def aggregate_cube(self):
+        return build_cube(self.records)
+
+    # 5b: Define function to return records with all filters applied (not memoized, only the small aggregates are kept in the cache)
+    def filtered_records(self, start_year, end_year, incident_group, borough_name):
+        return self.index.select(start_year, end_year, incident_group, borough_name)
+
+    # 5c: Define function to aggregate the filtered records (records taken from the row positions are dropped after computing)
+    def aggregate(self, start_year, end_year, incident_group, borough_name, compute):
+        return compute(self.index.select(start_year, end_year, incident_group, borough_name))
+
+    # 5d: Define function to return new engine of the same kind and settings on other records
+    def copy(self, records, cube, version):
+        return type(self)(records, self.cache.maxsize, cube, version)
+
+    # 5e: Define function to return new engine with records of changed years replaced (cube cells of other years are kept, merged records can be passed if already loaded)
+    def merge(self, partitions, removed_years, version, records=None):
+        years = list(partitions) + list(removed_years)
+        if records is None:
+            records = concat_records([self.records[~self.records["CalYear"].isin(years)]] + list(partitions.values()))
+        cube = concat_records([self.cube[~self.cube["CalYear"].isin(years)]] + [build_cube(partition) for partition in partitions.values()])
+        cube = cube.sort_values("CalYear", kind="stable", ignore_index=True)
+        return self.copy(records, cube, version)
+
+    # 5f: Define function to return new engine with changed partitions of record store merged (records mapped from column store if written)
+    def refresh(self, manifest, changed_years, removed_years):
+        records = map_column_store(manifest["version"])
+        return self.merge(read_partitions(manifest, changed_years), removed_years, manifest["version"], records)
+
+
+
+# Step 6: Define streaming filter engine holding only aggregates (records are read in chunks from disk for each new user selection) -----------------------------------
+class StreamingFilterEngine(BaseFilterEngine):
+    def __init__(self, manifest, maxsize=64, chunk_rows=CHUNK_ROWS, scan=None):
+        self.manifest = manifest
+        self.chunk_rows = chunk_rows
+        cube, self.empty_records = stream_cube(manifest, None, chunk_rows) if scan is None else scan
+        super().__init__(cube, maxsize, manifest["version"])
+
+    # 6a: Define function to aggregate the filtered records chunk by chunk
+    def aggregate(self, start_year, end_year, incident_group, borough_name, compute):
+        result = compute(self.empty_records)
+        dtypes = self.empty_records.dtypes.to_dict()
+        for chunk in iter_record_chunks(self.manifest, range(start_year, end_year + 1), self.chunk_rows):
+            chunk = chunk.astype(dtypes)
+            mask = chunk["CalYear"].between(start_year, end_year)
+            if incident_group != "All Incidents":
+                mask &= chunk["IncidentGroup"] == incident_group
+            if borough_name != "All Boroughs":
+                mask &= chunk["IncGeo_BoroughName"] == borough_name
+            result = add_partials(result, compute(chunk[mask]))
+        return result
+
+    # 6b: Define function to return new engine with cube cells of changed years streamed again
+    def refresh(self, manifest, changed_years, removed_years):
+        cube, empty_records = stream_cube(manifest, changed_years, self.chunk_rows)
+        kept_cube = self.cube[~self.cube["CalYear"].isin(changed_years + removed_years)]
+        cube = kept_cube if cube is None else merge_cubes([kept_cube, cube])
+        empty_records = self.empty_records if empty_records is None else concat_records([self.empty_records, empty_records])
+        return StreamingFilterEngine(manifest, self.cache.maxsize, self.chunk_rows, (cube, empty_records))
+
+
+# 6c: Define function to stream records of the given years into incident cube and empty records with categories of all chunks
+def stream_cube(manifest, years=None, chunk_rows=CHUNK_ROWS):
+    cube, empty_records = None, None
+    for chunk in iter_record_chunks(manifest, years, chunk_rows):
+        chunk_cube = build_cube(chunk)
+        cube = chunk_cube if cube is None else merge_cubes([cube, chunk_cube])
+        empty_records = chunk.iloc[:0] if empty_records is None else concat_records([empty_records, chunk.iloc[:0]])
+    return cube, empty_records
+
+
+
+# Step 7: Define parallel filter engine computing partial aggregates per year in a pool of worker processes -----------------------------------------------------------
+# Set LFB_WORKERS to the number of workers (default: number of cores)
+PARALLEL_WORKERS = int(os.environ.get("LFB_WORKERS", os.cpu_count() or 1))
+EXECUTORS = {}
+EXECUTORS_LOCK = threading.Lock()
+WORKER_INDEXES = {}
+
+
+# Raised by worker processes when the column store of an engine's data version was removed by a later ingest
+class StaleVersionError(LookupError):
+    pass
+
+
+# 7a: Define function to return pool shared by all engines of the process (processes map column store themselves, threads are used without column store)
+def parallel_executor(kind, workers):
+    with EXECUTORS_LOCK:
+        if (kind, workers) not in EXECUTORS:
+            if kind == "process":
+                EXECUTORS[(kind, workers)] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                EXECUTORS[(kind, workers)] = ThreadPoolExecutor(workers)
+        return EXECUTORS[(kind, workers)]
+
+
+# 7b: Define function run by worker process to aggregate records of one year of the user selection (index mapped from column store kept for latest data version, pages shared by all workers)
+def aggregate_year(version, year, incident_group, borough_name, compute):
+    if version not in WORKER_INDEXES:
+        records = map_column_store(version)
+        if records is None:
+            raise StaleVersionError(f"Column store of data version {version} was removed, refresh the engine to the current version")
+        WORKER_INDEXES.clear()
+        WORKER_INDEXES[version] = RecordIndex(records, map_position_index(version))
+    return compute(WORKER_INDEXES[version].select(year, year, incident_group, borough_name))
+
+
+# Workers are set up before the records are indexed, as aggregate_cube() already runs on them
+class ParallelFilterEngine(FilterEngine):
+    def __init__(self, records, maxsize=64, cube=None, version=None, workers=None):
+        self.workers = workers or PARALLEL_WORKERS
+        self.kind = "process" if version is not None and os.path.exists(column_store_dir(version)) else "thread"
+        self.executor = parallel_executor(self.kind, self.workers)
+        self.version = version
+        super().__init__(records, maxsize, cube, version)
+
+    # 7c: Define function to build incident cube from cubes of each year
+    def aggregate_cube(self):
+        return merge_cubes(self.map_years(min(self.index.years), max(self.index.years), "All Incidents", "All Boroughs", build_cube))
+
+    # 7d: Define function to compute aggregate of each year of the user selection in parallel (list of partial aggregates in year order)
+    # Sessions keep an engine of an older version until their next full rerun, if its column store was removed workers cannot map it and threads use the records still mapped by this process
+    def map_years(self, start_year, end_year, incident_group, borough_name, compute):
+        years = [int(year) for year in self.index.years if start_year <= year <= end_year]
+        if self.kind == "process":
+            try:
+                futures = [self.executor.submit(aggregate_year, self.version, year, incident_group, borough_name, compute) for year in years]
+                return [future.result() for future in futures]
+            except StaleVersionError:
+                pass
+        executor = self.executor if self.kind == "thread" else parallel_executor("thread", self.workers)
+        futures = [executor.submit(lambda year: compute(self.index.select(year, year, incident_group, borough_name)), year) for year in years]
+        return [future.result() for future in futures]
+
+    # 7e: Define function to aggregate the filtered records by merging partial aggregates per year (counts and sums add up)
+    def aggregate(self, start_year, end_year, incident_group, borough_name, compute):
+        result = compute(self.records.iloc[:0])
+        for partial_result in self.map_years(start_year, end_year, incident_group, borough_name, compute):
+            result = add_partials(result, partial_result)
+        return result
+
+    # 7f: Define function to return new engine with the same number of workers on other records (used when merging changed partitions)
+    def copy(self, records, cube, version):
+        return ParallelFilterEngine(records, self.cache.maxsize, cube, version, self.workers)
+
+
+
+# Step 8: Define live filter engine following the record store (changed year partitions are merged without full reload) -----------------------------------------------
+BACKENDS = ["memory", "parallel", "streaming", "sqlite", "duckdb"]
+
+
+# 8a: Define function to create filter engine of a backend ("memory" holds all records, "parallel" aggregates them per year in worker processes, "streaming" only holds aggregates, "sqlite" and "duckdb" query embedded database)
+def create_engine(backend, manifest, maxsize=64):
+    if backend == "memory":
+        return FilterEngine(load_records(manifest), maxsize, version=manifest["version"])
+    if backend == "parallel":
+        return ParallelFilterEngine(load_records(manifest), maxsize, version=manifest["version"])
+    if backend == "streaming":
+        return StreamingFilterEngine(manifest, maxsize)
+    if backend in ["sqlite", "duckdb"]:
+        from sql_engine import SQLFilterEngine
+        return SQLFilterEngine(backend, manifest, maxsize)
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+
+class LiveFilterEngine:
+    def __init__(self, backend="memory", maxsize=64):
+        self.manifest = read_manifest()
+        self.manifest_time = self.modification_time()
+        self.engine = create_engine(backend, self.manifest, maxsize)
+        self.lock = threading.Lock()
+
+    # 8b: Define function to return modification time of manifest (None if store was not created yet)
+    def modification_time(self):
+        return os.path.getmtime(MANIFEST_FILE) if os.path.exists(MANIFEST_FILE) else None
+
+    # 8c: Define function to return current engine after refreshing partitions changed since last call (one session refreshes, others keep using current engine)
+    def current(self):
+        manifest_time = self.modification_time()
+        if manifest_time != self.manifest_time and self.lock.acquire(blocking=False):
+            try:
+                manifest = read_manifest()
+                changed_years, removed_years = changed_partitions(self.manifest, manifest)
+                if changed_years or removed_years:
+                    self.engine = self.engine.refresh(manifest, changed_years, removed_years)
+                self.manifest = manifest
+                self.manifest_time = manifest_time
+            finally:
+                self.lock.release()
+        return self.engine
+
+
+# 8d: Define function to return live filter engine of a backend once per process (shared read-only by all sessions and the warm-up thread, later callers wait for first load)
+LIVE_ENGINES = {}
+LIVE_ENGINES_LOCK = threading.Lock()
+
+
+def live_engine(backend="memory"):
+    with LIVE_ENGINES_LOCK:
+        if backend not in LIVE_ENGINES:
+            LIVE_ENGINES[backend] = LiveFilterEngine(backend)
+        return LIVE_ENGINES[backend]
@@ -0,0 +1,112 @@
+# FIRECRACKER - INSTRUMENTATION
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import pandas as pd
+
+
+
+# Step 2: Define rolling in-process store of stage measurements -------------------------------------------------------------------------------------------------------
+# Set LFB_METRICS_FILE to append every measurement as JSON line for the log pipeline
+# Set LFB_TRACE_MEMORY=1 to record memory allocated per stage (Python allocations of all threads, slows down every stage)
+MAX_MEASUREMENTS = 5000
+MEASUREMENTS = deque(maxlen=MAX_MEASUREMENTS)
+MEASUREMENTS_LOCK = threading.Lock()
+METRICS_FILE = os.environ.get("LFB_METRICS_FILE")
+RUN_IDS = itertools.count(1)
+CURRENT_RUN = threading.local()
+if os.environ.get("LFB_TRACE_MEMORY") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+# 2a: Define functions to start and end a run of the script, a fragment or the warm-up (each script run has its own thread)
+def begin_run(name):
+    CURRENT_RUN.id = next(RUN_IDS)
+    CURRENT_RUN.name = name
+    return CURRENT_RUN.id
+
+
+def end_run():
+    CURRENT_RUN.id = None
+
+
+# 2b: Define functions to continue the current run in a worker thread (stages of a thread pool are measured within the run that started them)
+def current_run():
+    return getattr(CURRENT_RUN, "id", None), getattr(CURRENT_RUN, "name", None)
+
+
+def join_run(run):
+    CURRENT_RUN.id, CURRENT_RUN.name = run
+
+
+# 2c: Define function to add measurement to store and metrics file
+def record(measurement):
+    with MEASUREMENTS_LOCK:
+        MEASUREMENTS.append(measurement)
+        if METRICS_FILE:
+            with open(METRICS_FILE, "a") as file:
+                file.write(json.dumps(measurement) + "\n")
+
+
+
+# Step 3: Define context manager and decorator measuring wall time, rows and allocated memory of a stage --------------------------------------------------------------
+# Stage outside a run (e.g. fragment rerun) starts its own run, callers set measurement["rows"] to the number of records covered by the stage where known
+@contextmanager
+def stage(name):
+    outermost = getattr(CURRENT_RUN, "id", None) is None
+    if outermost:
+        begin_run(name)
+    measurement = {"run": CURRENT_RUN.id, "run_name": CURRENT_RUN.name, "stage": name, "time": time.time(), "seconds": None, "rows": None, "memory_bytes": None}
+    memory_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+    start = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        measurement["seconds"] = time.perf_counter() - start
+        if memory_before is not None:
+            measurement["memory_bytes"] = tracemalloc.get_traced_memory()[0] - memory_before
+        record(measurement)
+        if outermost:
+            end_run()
+
+
+# 3a: Define decorator measuring a function as stage named after the function (fragment reruns start their own run)
+def instrumented(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with stage(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+
+# Step 4: Define functions to read and export measurements ------------------------------------------------------------------------------------------------------------
+# 4a: Define function to return measurements as data frame (of one run if requested)
+def measurements(run=None):
+    with MEASUREMENTS_LOCK:
+        data = pd.DataFrame(list(MEASUREMENTS), columns=["run", "run_name", "stage", "time", "seconds", "rows", "memory_bytes"])
+    if run is not None:
+        data = data[data["run"] == run]
+    return data
+
+
+# 4b: Define function to summarize wall time of each stage over the rolling store
+def summarize():
+    data = measurements()
+    grouped = data.groupby("stage", sort=False)["seconds"]
+    summary = pd.DataFrame({"calls": grouped.count(), "median_ms": grouped.median() * 1000, "p95_ms": grouped.quantile(0.95) * 1000, "max_ms": grouped.max() * 1000})
+    return summary.sort_values("median_ms", ascending=False).round(1)
+
+
+# 4c: Define function to export measurements as JSON lines
+def export_jsonl():
+    with MEASUREMENTS_LOCK:
+        return "".join(json.dumps(measurement) + "\n" for measurement in MEASUREMENTS)
@@ -0,0 +1,134 @@
+# FIRECRACKER - DASHBOARD QUERIES
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import os
+from functools import wraps
+import numpy as np
+import pandas as pd
+from analytics import roll_up, average, time_distribution, breakdown, top_breakdown, quarterly_averages, TIME_PERIODS
+from caching import DiskCache, CACHE_DIR, file_hash
+
+
+
+# Step 2: Define disk cache of query results shared by all processes and restarts (keyed by data version, version of query code and user selection) -------------------
+# Set LFB_AGGREGATE_CACHE_MB to the size limit of cached query results (0 disables the cache)
+AGGREGATE_CACHE_DIR = os.path.join(CACHE_DIR, "aggregates")
+AGGREGATE_CACHE_MB = float(os.environ.get("LFB_AGGREGATE_CACHE_MB", 256))
+AGGREGATE_CACHE = DiskCache(AGGREGATE_CACHE_DIR, int(AGGREGATE_CACHE_MB * 2**20))
+
+# 2a: Define version of code calculating the query results (results of older code or other pandas and numpy versions are not served after an update)
+QUERY_MODULES = ["analytics.py", "queries.py", "schema.py", "filter_engine.py", "sql_engine.py", "data_loader.py"]
+CODE_VERSION = file_hash([os.path.join(os.path.dirname(os.path.abspath(__file__)), module) for module in QUERY_MODULES]) + f"-pandas{pd.__version__}-numpy{np.__version__}"
+
+
+# 2b: Define decorator memoizing a query in the filter engine and persisting it in the disk cache (not persisted without data version of record store)
+def persisted(query):
+    @wraps(query)
+    def wrapper(filter_engine, *args, **kwargs):
+        if filter_engine.version is None or AGGREGATE_CACHE_MB <= 0:
+            return query(filter_engine, *args, **kwargs)
+        key = (query.__name__,) + args + tuple(sorted(kwargs.items()))
+        version = f"{filter_engine.version}-{CODE_VERSION}"
+        return filter_engine.memoize(("persisted",) + key, lambda: AGGREGATE_CACHE.get_or_compute(version, key, lambda: query(filter_engine, *args, **kwargs)))
+    return wrapper
+
+
+
+# Step 3: Define options of filters and chart dropdowns (first option is the default) ---------------------------------------------------------------------------------
+INCIDENT_GROUPS = ["All Incidents", "False Alarm", "Fire", "Special Service"]
+CHART_TYPES = ["Absolute", "Percentage"]
+MAP_METRICS = ["Number of Incidents", "Percentage of Delays", "Average Attendance Times (in seconds)", "Average Pump Minutes Rounded"]
+TIME_PERIOD_OPTIONS = list(TIME_PERIODS)
+COMPARISON_METRICS = ["Average Attendance Time by Component", "Average Attendance Time by Incident Group"]
+PROPERTY_COLUMNS = {"Property Category": "Grouped_PropertyCategory", "Property Type": "PropertyType"}
+
+
+# 3a: Define function to return column splitting the selected incident group into types
+def group_column(incident_group):
+    if incident_group == "All Incidents":
+        return "IncidentGroup"
+    if incident_group == "Special Service":
+        return "Grouped_SpecialServiceType"
+    return "StopCodeDescription"
+
+
+
+# Step 4: Define function to count displayed incidents and their share of all incidents -------------------------------------------------------------------------------
+def incident_facts(unfiltered_cube, filtered_cube):
+    filtered_total = int(filtered_cube["Count"].sum())
+    return {"filtered_total": filtered_total, "share_total": filtered_total / unfiltered_cube["Count"].sum() * 100}
+
+
+
+# Step 5: Define function to count incidents per year and incident group or type (shares per year for chart type "Percentage") ----------------------------------------
+@persisted
+def development_table(filter_engine, start_year, end_year, incident_group, borough_name, chart_type="Absolute"):
+    filtered_cube = filter_engine.filtered_cube(start_year, end_year, incident_group, borough_name)
+    column = group_column(incident_group)
+    grouped_data = roll_up(filtered_cube, ["CalYear", column])["Count"].reset_index()
+    pivot_table = grouped_data.pivot(index="CalYear", columns=column, values="Count").fillna(0)
+    if chart_type == "Percentage":
+        pivot_table = pivot_table.div(pivot_table.sum(axis=1), axis=0) * 100
+    return pivot_table
+
+
+
+# Step 6: Define functions to calculate map metric per borough and its summary statistic (answered from dense borough matrix of filter engine) ------------------------
+# 6a: Define function to calculate map metric per borough with records
+@persisted
+def borough_values(filter_engine, start_year, end_year, incident_group, map_metric="Number of Incidents"):
+    by_borough = filter_engine.borough_matrix.by_borough(start_year, end_year, incident_group)
+    if map_metric == "Number of Incidents":
+        values = by_borough["Count"]
+    elif map_metric == "Percentage of Delays":
+        values = (by_borough["Delayed"] / by_borough["Count"] * 100).fillna(0)
+    elif map_metric == "Average Attendance Times (in seconds)":
+        values = average(by_borough, "FirstPumpArriving_AttendanceTime")
+    else:
+        values = average(by_borough, "PumpMinutesRounded")
+    return values.rename("Data")
+
+
+# 6b: Define function to calculate statistic of map metric (average per borough, or deviation of selected borough from it for number of incidents)
+@persisted
+def borough_statistic(filter_engine, start_year, end_year, incident_group, borough_name, map_metric="Number of Incidents"):
+    filtered_totals = filter_engine.borough_matrix.totals(start_year, end_year, incident_group, borough_name)
+    if map_metric == "Number of Incidents":
+        average_all_boroughs = filter_engine.borough_matrix.by_borough(start_year, end_year, incident_group)["Count"].mean()
+        statistic = average_all_boroughs if borough_name == "All Boroughs" else filtered_totals["Count"] - average_all_boroughs
+        # Selections without any borough have no average (NaN like the other metrics of selections without responses)
+        return round(statistic) if pd.notna(statistic) else np.nan
+    if map_metric == "Percentage of Delays":
+        return round(filtered_totals["Delayed"] / filtered_totals["Count"] * 100, 1)
+    if map_metric == "Average Attendance Times (in seconds)":
+        return round(float(average(filtered_totals, "FirstPumpArriving_AttendanceTime")), 1)
+    return round(float(average(filtered_totals, "PumpMinutesRounded")), 1)
+
+
+
+# Step 7: Define function to count incidents per time period and incident group or type (histogram of all time periods is built once per filter selection) ------------
+@persisted
+def time_period_table(filter_engine, start_year, end_year, incident_group, borough_name, time_period="Month"):
+    histogram = filter_engine.time_histogram(start_year, end_year, incident_group, borough_name, group_column(incident_group))
+    return time_distribution(histogram, time_period)
+
+
+
+# Step 8: Define function to calculate quarterly average response times (both comparison metrics calculated in one pass over cube slice of selected years and borough)
+@persisted
+def response_times(filter_engine, start_year, end_year, incident_group, borough_name, comparison_metric="Average Attendance Time by Component"):
+    cube_without_incident_group = filter_engine.cube_without_incident_group(start_year, end_year, borough_name)
+    key = ("average_times", start_year, end_year, incident_group, borough_name)
+    average_times, average_times_incident_group = filter_engine.memoize(key, lambda: quarterly_averages(cube_without_incident_group, start_year, end_year, incident_group))
+    return average_times if comparison_metric == "Average Attendance Time by Component" else average_times_incident_group
+
+
+
+# Step 9: Define function to count incidents per property category or type (categories sorted by count, property types reduced to 5 largest and "Other") --------------
+@persisted
+def property_breakdown(filter_engine, start_year, end_year, incident_group, borough_name, property_metric="Property Category"):
+    column = PROPERTY_COLUMNS[property_metric]
+    counts = filter_engine.category_counts(start_year, end_year, incident_group, borough_name, column)
+    if property_metric == "Property Category":
+        return breakdown(counts, column)
+    return top_breakdown(counts, column, k=5)
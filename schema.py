@@ -0,0 +1,130 @@
+# FIRECRACKER - DATA SCHEMA
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+
+
+# Step 2: Define source data types used to parse the CSV extracts -----------------------------------------------------------------------------------------------------
+SOURCE_DTYPES = {
+    "CalYear": "int64",
+    "Quarter_Year": "object",
+    "Month": "object",
+    "DayOfWeek": "object",
+    "HourOfCall": "int64",
+    "IncidentGroup": "object",
+    "StopCodeDescription": "object",
+    "Grouped_SpecialServiceType": "object",
+    "Grouped_PropertyCategory": "object",
+    "PropertyType": "object",
+    "IncGeo_BoroughName": "object",
+    "Grouped_DelayType": "object",
+    "FirstPumpArriving_AttendanceTime": "float64",
+    "TravelTimeSeconds": "float64",
+    "TurnoutTimeSeconds": "float64",
+    "PumpMinutesRounded": "float64"
+}
+
+
+
+# Step 3: Define memory-compact data types of the merged records ------------------------------------------------------------------------------------------------------
+# 3a: Define display order of time periods
+MONTH_ORDER = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+DAY_OF_WEEK_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# 3b: Define columns stored as categoricals (categories taken from the data, or fixed and ordered for time periods)
+CATEGORICAL_COLUMNS = [
+    "IncGeo_BoroughName",
+    "IncidentGroup",
+    "StopCodeDescription",
+    "Grouped_SpecialServiceType",
+    "Grouped_DelayType",
+    "Grouped_PropertyCategory",
+    "PropertyType"
+]
+ORDERED_CATEGORIES = {
+    "Month": MONTH_ORDER,
+    "DayOfWeek": DAY_OF_WEEK_ORDER
+}
+
+# 3c: Define downcast numeric columns
+NUMERIC_DTYPES = {
+    "CalYear": "int16",
+    "HourOfCall": "int8",
+    "FirstPumpArriving_AttendanceTime": "float32",
+    "TravelTimeSeconds": "float32",
+    "TurnoutTimeSeconds": "float32",
+    "PumpMinutesRounded": "float32"
+}
+
+# 3d: Define data types parsed directly from the CSV extracts (compact types declared up front, so values are not inferred or converted after parsing)
+CSV_DTYPES = dict(
+    SOURCE_DTYPES,
+    **NUMERIC_DTYPES,
+    **{column: "category" for column in CATEGORICAL_COLUMNS + ["Quarter_Year"]},
+    **{column: pd.CategoricalDtype(categories, ordered=True) for column, categories in ORDERED_CATEGORIES.items()}
+)
+
+
+
+# Step 4: Define functions to apply compact schema --------------------------------------------------------------------------------------------------------------------
+# 4a: Define function to sort quarters ("Q1_2015") chronologically
+def quarter_order(quarters):
+    return sorted(quarters, key=lambda quarter: (int(quarter[3:]), quarter[:2]))
+
+
+# 4b: Define function to convert merged records into compact data types
+def apply_schema(records):
+    compact_records = records.astype(NUMERIC_DTYPES, copy=False)
+    for column in CATEGORICAL_COLUMNS:
+        compact_records[column] = compact_records[column].astype("category")
+    for column, categories in ORDERED_CATEGORIES.items():
+        compact_records[column] = compact_records[column].astype(pd.CategoricalDtype(categories, ordered=True))
+    quarters = quarter_order(compact_records["Quarter_Year"].dropna().unique())
+    compact_records["Quarter_Year"] = compact_records["Quarter_Year"].astype(pd.CategoricalDtype(quarters, ordered=True))
+    return compact_records
+
+
+# 4c: Define function to order categories of a column merged from records read separately (in the same order as apply_schema)
+def merged_categories(column, categories):
+    if column == "Quarter_Year":
+        return quarter_order(categories)
+    return ORDERED_CATEGORIES.get(column, sorted(categories))
+
+
+# 4d: Define function to concatenate compact records read separately (categories are merged so columns stay categorical)
+# Columns are filled into preallocated arrays, categorical codes are remapped in place instead of converting every frame before concatenating
+def concat_records(frames):
+    frames = list(frames)
+    if not frames:
+        raise ValueError("No records to concatenate")
+    offsets = np.cumsum([0] + [len(frame) for frame in frames])
+    columns = {}
+    for column in frames[0].columns:
+        dtypes = [frame[column].dtype for frame in frames]
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            categories = merged_categories(column, set().union(*(dtype.categories for dtype in dtypes)))
+            dtype = pd.CategoricalDtype(categories, ordered=dtypes[0].ordered)
+            codes = np.empty(offsets[-1], dtype=code_dtype(len(categories)))
+            for frame, start, end in zip(frames, offsets[:-1], offsets[1:]):
+                # Map codes of the frame to merged categories (missing values keep code -1 as last entry of mapping)
+                mapping = np.append(dtype.categories.get_indexer(frame[column].cat.categories), -1).astype(codes.dtype)
+                np.take(mapping, frame[column].cat.codes.to_numpy(), out=codes[start:end])
+            columns[column] = pd.Categorical.from_codes(codes, dtype=dtype, validate=False)
+        elif all(isinstance(dtype, np.dtype) for dtype in dtypes):
+            values = np.empty(offsets[-1], dtype=np.result_type(*dtypes))
+            for frame, start, end in zip(frames, offsets[:-1], offsets[1:]):
+                values[start:end] = frame[column].to_numpy()
+            columns[column] = values
+        else:
+            columns[column] = pd.concat([frame[column] for frame in frames], ignore_index=True).array
+    return pd.DataFrame(columns, copy=False)
+
+
+# 4e: Define function to return smallest integer type of categorical codes (same as pandas uses, so codes are not copied again)
+def code_dtype(category_count):
+    for dtype in [np.int8, np.int16, np.int32]:
+        if category_count < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
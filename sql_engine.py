@@ -0,0 +1,170 @@
+# FIRECRACKER - SQL ENGINE
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from analytics import CUBE_KEYS, CUBE_METRICS, CUBE_MEASURES, HOURS
+from data_loader import STORE_DIR, iter_record_chunks
+from filter_engine import BaseFilterEngine
+from schema import SOURCE_DTYPES, NUMERIC_DTYPES, CATEGORICAL_COLUMNS, ORDERED_CATEGORIES, MONTH_ORDER, DAY_OF_WEEK_ORDER, merged_categories
+
+
+
+# Step 2: Define table of records and queries shared by SQLite and DuckDB ---------------------------------------------------------------------------------------------
+# 2a: Define column types of records table
+COLUMN_TYPES = {column: "DOUBLE" if dtype == "float64" else "INTEGER" if dtype == "int64" else "TEXT" for column, dtype in SOURCE_DTYPES.items()}
+CREATE_TABLE = "CREATE TABLE records ({})".format(", ".join(f"{column} {column_type}" for column, column_type in COLUMN_TYPES.items()))
+CREATE_INDEXES = [
+    "CREATE INDEX records_year ON records (CalYear)",
+    "CREATE INDEX records_group_borough_year ON records (IncidentGroup, IncGeo_BoroughName, CalYear)",
+    "CREATE INDEX records_borough_year ON records (IncGeo_BoroughName, CalYear)"
+]
+
+# 2b: Define measures of incident cube (same as analytics.build_cube, missing times are skipped by SUM and COUNT)
+CUBE_SELECT = ", ".join(
+    CUBE_KEYS
+    + ["COUNT(*) AS Count", "SUM(CASE WHEN Grouped_DelayType = 'Delayed' THEN 1 ELSE 0 END) AS Delayed"]
+    + [f"COALESCE(SUM({metric}), 0) AS {metric}_sum, COUNT({metric}) AS {metric}_n" for metric in CUBE_METRICS]
+)
+
+
+# 2c: Define function to build WHERE clause and parameters of a user selection
+def where_clause(start_year, end_year, incident_group, borough_name):
+    conditions, parameters = ["CalYear BETWEEN ? AND ?"], [start_year, end_year]
+    if incident_group != "All Incidents":
+        conditions.append("IncidentGroup = ?")
+        parameters.append(incident_group)
+    if borough_name != "All Boroughs":
+        conditions.append("IncGeo_BoroughName = ?")
+        parameters.append(borough_name)
+    return " AND ".join(conditions), parameters
+
+
+
+# Step 3: Define functions to build database from record store --------------------------------------------------------------------------------------------------------
+# 3a: Define function to return database file of a data version (database without record store is kept in memory and rebuilt at every start)
+def database_path(backend, version):
+    if version is None:
+        return ":memory:"
+    return os.path.join(STORE_DIR, f"records-{version[:16]}.{backend}")
+
+
+# 3b: Define function to connect to SQLite or DuckDB (DuckDB is an optional dependency)
+def connect(backend, path, read_only=False):
+    if backend == "sqlite":
+        if read_only:
+            return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        return sqlite3.connect(path, check_same_thread=False)
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("DuckDB backend requires the duckdb package (pip install duckdb)")
+    return duckdb.connect(path, read_only=read_only)
+
+
+# 3c: Define function to insert chunk of records (categoricals as text, missing values as NULL)
+def insert_chunk(connection, backend, chunk):
+    chunk = chunk[list(SOURCE_DTYPES)].astype({column: "object" for column in chunk.select_dtypes("category").columns})
+    if backend == "duckdb":
+        connection.register("chunk", chunk)
+        connection.execute("INSERT INTO records SELECT * FROM chunk")
+        connection.unregister("chunk")
+    else:
+        rows = chunk.astype("object").where(chunk.notna(), None).itertuples(index=False, name=None)
+        connection.executemany(f"INSERT INTO records VALUES ({', '.join('?' * len(SOURCE_DTYPES))})", rows)
+
+
+# 3d: Define function to stream records of the record store into a new database (written to temporary file and renamed when complete)
+def build_database(backend, manifest, path):
+    temporary_path = path if path == ":memory:" else f"{path}.{os.getpid()}.tmp"
+    connection = connect(backend, temporary_path)
+    connection.execute(CREATE_TABLE)
+    for chunk in iter_record_chunks(manifest):
+        insert_chunk(connection, backend, chunk)
+    if backend == "sqlite":
+        for statement in CREATE_INDEXES:
+            connection.execute(statement)
+        connection.commit()
+    if path == ":memory:":
+        return connection
+    connection.close()
+    os.replace(temporary_path, path)
+
+    # Remove databases of older versions
+    for file_name in os.listdir(STORE_DIR):
+        if file_name.startswith("records-") and file_name.endswith(f".{backend}") and os.path.join(STORE_DIR, file_name) != path:
+            os.remove(os.path.join(STORE_DIR, file_name))
+    return connect(backend, path, read_only=True)
+
+
+
+# Step 4: Define filter engine answering all queries of the dashboard from embedded database --------------------------------------------------------------------------
+class SQLFilterEngine(BaseFilterEngine):
+    def __init__(self, backend, manifest, maxsize=64):
+        path = database_path(backend, manifest["version"])
+        self.connection = connect(backend, path, read_only=True) if os.path.exists(path) else build_database(backend, manifest, path)
+        self.backend = backend
+        self.manifest = manifest
+        self.lock = threading.Lock()
+        self.dtypes = self.category_dtypes()
+        super().__init__(self.query_cube("1 = 1", []), maxsize, manifest["version"])
+
+    # 4a: Define function to run query (connection is shared by all sessions, so queries run one at a time)
+    def query(self, sql, parameters):
+        with self.lock:
+            cursor = self.connection.execute(sql, parameters)
+            columns = [column[0] for column in cursor.description]
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+    # 4b: Define function to read categories of categorical columns (in the same order as the in-memory records)
+    def category_dtypes(self):
+        dtypes = {}
+        for column in ["Quarter_Year"] + CATEGORICAL_COLUMNS + list(ORDERED_CATEGORIES):
+            categories = self.query(f"SELECT DISTINCT {column} FROM records WHERE {column} IS NOT NULL", [])[column]
+            dtypes[column] = pd.CategoricalDtype(merged_categories(column, set(categories)), ordered=column in ORDERED_CATEGORIES or column == "Quarter_Year")
+        return dtypes
+
+    # 4c: Define function to query incident cube cells (sorted and typed like analytics.build_cube)
+    def query_cube(self, where, parameters):
+        cube = self.query(f"SELECT {CUBE_SELECT} FROM records WHERE {where} GROUP BY {', '.join(CUBE_KEYS)}", parameters)
+        cube = cube.astype({key: self.dtypes.get(key, NUMERIC_DTYPES.get(key)) for key in CUBE_KEYS})
+        cube = cube.astype({measure: "float64" if measure.endswith("_sum") else "int32" for measure in CUBE_MEASURES})
+        return cube.sort_values(CUBE_KEYS, na_position="last", ignore_index=True)
+
+    # 4d: Define function to return cube slice with all filters applied
+    def filtered_cube(self, start_year, end_year, incident_group, borough_name):
+        key = ("cube", start_year, end_year, incident_group, borough_name)
+        return self.memoize(key, lambda: self.query_cube(*where_clause(start_year, end_year, incident_group, borough_name)))
+
+    # 4e: Define function to count filtered records per month, weekday, hour and category of a column (same array as analytics.time_histogram, memoized by base engine)
+    def compute_time_histogram(self, start_year, end_year, incident_group, borough_name, column):
+        where, parameters = where_clause(start_year, end_year, incident_group, borough_name)
+        counts = self.query(
+            f"SELECT Month, DayOfWeek, HourOfCall, {column}, COUNT(*) AS Count FROM records "
+            f"WHERE {where} AND Month IS NOT NULL AND DayOfWeek IS NOT NULL AND {column} IS NOT NULL AND HourOfCall BETWEEN 0 AND {len(HOURS) - 1} "
+            f"GROUP BY Month, DayOfWeek, HourOfCall, {column}",
+            parameters
+        )
+        categories = self.dtypes[column].categories
+        histogram = np.zeros((len(MONTH_ORDER), len(DAY_OF_WEEK_ORDER), len(HOURS), len(categories)), dtype=np.int64)
+        histogram[
+            pd.Categorical(counts["Month"], MONTH_ORDER).codes,
+            pd.Categorical(counts["DayOfWeek"], DAY_OF_WEEK_ORDER).codes,
+            counts["HourOfCall"].to_numpy(dtype=np.int64),
+            pd.Categorical(counts[column], categories).codes
+        ] = counts["Count"].to_numpy()
+        return histogram, categories
+
+    # 4f: Define function to count filtered records per category of a column (same series as analytics.category_counts, memoized by base engine)
+    def compute_category_counts(self, start_year, end_year, incident_group, borough_name, column):
+        where, parameters = where_clause(start_year, end_year, incident_group, borough_name)
+        counts = self.query(f"SELECT {column}, COUNT(*) AS Count FROM records WHERE {where} AND {column} IS NOT NULL GROUP BY {column}", parameters)
+        counts = counts.set_index(column)["Count"].reindex(self.dtypes[column].categories, fill_value=0)
+        return counts.astype(np.int64).rename(None).rename_axis(None)
+
+    # 4g: Define function to return new engine on database of new data version
+    def refresh(self, manifest, changed_years, removed_years):
+        return SQLFilterEngine(self.backend, manifest, self.cache.maxsize)
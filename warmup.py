@@ -0,0 +1,81 @@
+# FIRECRACKER - WARM-UP
+
+# Step 1: Import modules ----------------------------------------------------------------------------------------------------------------------------------------------
+import argparse
+import logging
+import os
+import threading
+import time
+from filter_engine import BACKENDS, live_engine
+from borough_map import TOPOJSON_FILE
+from instrumentation import begin_run, end_run
+
+LOGGER = logging.getLogger("firecracker.warmup")
+
+
+
+# Step 2: Define warm-up of default selection (full year range, "All Incidents", "All Boroughs") ----------------------------------------------------------------------
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_vF.py")
+
+
+# 2a: Define function to load filter engine and render default selection without a session
+# Streamlit commands outside a session render nothing and return widget defaults, so charts are built with their default dropdown options
+# Engine, memoized aggregates, boundaries and figures are held in imported modules and shared with all sessions of this process
+def warm_up(backend="memory"):
+    begin_run("warm-up")
+    start = time.perf_counter()
+    filter_engine = live_engine(backend).current()
+    LOGGER.info("Loaded %s filter engine in %.2f s", backend, time.perf_counter() - start)
+
+    logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").setLevel(logging.ERROR)
+    import app_vF
+    start_year, end_year = int(filter_engine.cube["CalYear"].min()), int(filter_engine.cube["CalYear"].max())
+    selection = (filter_engine, start_year, end_year, "All Incidents", "All Boroughs")
+    map_geometry = "topojson" if os.path.exists(TOPOJSON_FILE) else "geojson"
+    steps = [
+        ("incident facts", lambda: filter_engine.filtered_cube(*selection[1:])),
+        ("development", lambda: app_vF.display_development_incident_group(*selection)),
+        ("map", lambda: app_vF.display_map(*selection, map_geometry)),
+        ("time period", lambda: app_vF.display_incidents_by_time(*selection)),
+        ("average times", lambda: app_vF.display_average_times(*selection)),
+        ("property", lambda: app_vF.display_split_by_property(*selection))
+    ]
+    for name, step in steps:
+        step_start = time.perf_counter()
+        step()
+        LOGGER.info("Warmed up %s in %.2f s", name, time.perf_counter() - step_start)
+    LOGGER.info("Warm-up of default selection finished in %.2f s", time.perf_counter() - start)
+    end_run()
+
+
+# 2b: Define function to run warm-up in background thread (errors are logged, sessions then load everything on demand as without warm-up)
+def start_warm_up(backend="memory"):
+    def run():
+        try:
+            warm_up(backend)
+        except Exception:
+            LOGGER.exception("Warm-up failed")
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+
+# Step 3: Start web application with warm-up running in the background ("python warmup.py" instead of "streamlit run app_vF.py") --------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start web application and warm up caches of the default selection in the background")
+    parser.add_argument("--backend", default=os.environ.get("LFB_BACKEND", "memory"), choices=BACKENDS)
+    parser.add_argument("--port", type=int, help="port of web application (default from Streamlit configuration)")
+    parser.add_argument("--warm-up-only", action="store_true", help="only warm up and log timings without starting web application")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    os.environ["LFB_BACKEND"] = args.backend
+
+    thread = start_warm_up(args.backend)
+    if args.warm_up_only:
+        thread.join()
+    else:
+        from streamlit.web import bootstrap
+        flag_options = {} if args.port is None else {"server_port": args.port}
+        bootstrap.load_config_options(flag_options)
+        bootstrap.run(APP_FILE, False, [], flag_options)